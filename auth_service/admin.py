@@ -1,7 +1,18 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from .utils import is_user_db_model
 
 
+class RemoteFieldsChangeList(ChangeList):
+
+    def get_results(self, request):
+        super().get_results(request)
+        # hydrate the whole page in one call when remote columns are displayed
+        remote_fields = getattr(self.model, 'remote_fields', {})
+        if any(field in remote_fields for field in self.list_display):
+            self.result_list = self.result_list.with_remote_fields()
+
+
 class CustomUserAdmin(admin.ModelAdmin):
     list_display = ['id', 'national_id']
     fieldsets = (
@@ -12,6 +23,9 @@ class CustomUserAdmin(admin.ModelAdmin):
     )
     readonly_fields = ['national_id', 'is_staff', 'is_superuser']
 
+    def get_changelist(self, request, **kwargs):
+        return RemoteFieldsChangeList
+
 
 if is_user_db_model():
     from django.contrib.auth import get_user_model
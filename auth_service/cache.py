@@ -0,0 +1,481 @@
+import hashlib
+import math
+import random
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+
+# bump when the shape of a cached payload changes, so old entries are never read back
+CACHE_SCHEMA_VERSION = 1
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache bounded by entry count, with a per-entry timeout.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        if timeout <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def delete_where(self, predicate):
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_shared_cache():
+    return caches[getattr(settings, "AUTH_CACHE_ALIAS", DEFAULT_CACHE_ALIAS)]
+
+
+class TieredCache:
+    """
+    Two-tier cache for one entity kind: a bounded in-process LRU in front of the
+    django cache named by AUTH_CACHE_ALIAS.
+
+    Keys are namespaced by SERVICE_NAME/SUB_SERVICE_NAME and CACHE_SCHEMA_VERSION.
+    The timeouts and local size are read from ``AUTH_{ENTITY}_CACHE_TTL``,
+    ``AUTH_{ENTITY}_CACHE_LOCAL_TTL`` and ``AUTH_{ENTITY}_CACHE_MAX_SIZE``.
+
+    ``fresh_for(value)`` may be given to tell how many more seconds a value read
+    from the shared tier is usable; values it returns 0 for count as misses.
+    """
+
+    def __init__(self, entity, ttl, local_ttl=5, max_size=1024, fresh_for=None):
+        self.entity = entity
+        self._default_ttl = ttl
+        self._default_local_ttl = local_ttl
+        self._default_max_size = max_size
+        self._fresh_for = fresh_for
+        self._local = None
+        self._lock = Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        registry[entity] = self
+
+    def _setting(self, name, default):
+        return getattr(settings, f"AUTH_{self.entity.upper()}_CACHE_{name}", default)
+
+    @property
+    def ttl(self):
+        return self._setting("TTL", self._default_ttl)
+
+    @property
+    def local_ttl(self):
+        return self._setting("LOCAL_TTL", self._default_local_ttl)
+
+    @property
+    def local(self):
+        if self._local is None:
+            with self._lock:
+                if self._local is None:
+                    self._local = LRUCache(self._setting("MAX_SIZE", self._default_max_size))
+        return self._local
+
+    @property
+    def shared(self):
+        return get_shared_cache()
+
+    def make_key(self, key):
+        service_name = getattr(settings, "SERVICE_NAME", None)
+        sub_service_name = getattr(settings, "SUB_SERVICE_NAME", None)
+        return f"auth:{CACHE_SCHEMA_VERSION}:{service_name}:{sub_service_name}:{self.entity}:{key}"
+
+    def get(self, key, default=None):
+        cache_key = self.make_key(key)
+        value = self.local.get(cache_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        return self._get_shared(cache_key, default)
+
+    async def aget(self, key, default=None):
+        cache_key = self.make_key(key)
+        value = self.local.get(cache_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        return await sync_to_async(self._get_shared)(cache_key, default)
+
+    def _get_shared(self, cache_key, default=None):
+        value = self.shared.get(cache_key)
+        if value is not None:
+            fresh_for = self.local_ttl if self._fresh_for is None else self._fresh_for(value)
+            if fresh_for > 0:
+                self.shared_hits += 1
+                self.local.set(cache_key, value, min(fresh_for, self.local_ttl))
+                return value
+        self.misses += 1
+        return default
+
+    def get_many(self, keys):
+        found, missing = self._get_many_local(keys)
+        if missing:
+            found.update(self._get_many_shared(missing))
+        return found
+
+    async def aget_many(self, keys):
+        found, missing = self._get_many_local(keys)
+        if missing:
+            found.update(await sync_to_async(self._get_many_shared)(missing))
+        return found
+
+    def _get_many_local(self, keys):
+        found, missing = {}, {}
+        for key in keys:
+            cache_key = self.make_key(key)
+            value = self.local.get(cache_key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing[cache_key] = key
+        self.hits += len(found)
+        return found, missing
+
+    def _get_many_shared(self, missing):
+        found = {}
+        for cache_key, value in self.shared.get_many(list(missing)).items():
+            fresh_for = self.local_ttl if self._fresh_for is None else self._fresh_for(value)
+            if fresh_for > 0:
+                self.local.set(cache_key, value, min(fresh_for, self.local_ttl))
+                found[missing[cache_key]] = value
+        self.shared_hits += len(found)
+        self.misses += len(missing) - len(found)
+        return found
+
+    def set(self, key, value, timeout=None, shared_timeout=None):
+        timeout = self.ttl if timeout is None else timeout
+        if timeout <= 0:
+            return
+        cache_key = self.make_key(key)
+        self.shared.set(cache_key, value, timeout=shared_timeout or timeout)
+        self.local.set(cache_key, value, min(timeout, self.local_ttl))
+
+    async def aset(self, key, value, timeout=None, shared_timeout=None):
+        timeout = self.ttl if timeout is None else timeout
+        if timeout <= 0:
+            return
+        cache_key = self.make_key(key)
+        await self.shared.aset(cache_key, value, timeout=shared_timeout or timeout)
+        self.local.set(cache_key, value, min(timeout, self.local_ttl))
+
+    def set_many(self, mapping, timeout=None):
+        timeout = self.ttl if timeout is None else timeout
+        if timeout <= 0 or not mapping:
+            return
+        entries = {self.make_key(key): value for key, value in mapping.items()}
+        self.shared.set_many(entries, timeout=timeout)
+        for cache_key, value in entries.items():
+            self.local.set(cache_key, value, min(timeout, self.local_ttl))
+
+    async def aset_many(self, mapping, timeout=None):
+        timeout = self.ttl if timeout is None else timeout
+        if timeout <= 0 or not mapping:
+            return
+        entries = {self.make_key(key): value for key, value in mapping.items()}
+        await self.shared.aset_many(entries, timeout=timeout)
+        for cache_key, value in entries.items():
+            self.local.set(cache_key, value, min(timeout, self.local_ttl))
+
+    def delete(self, key):
+        cache_key = self.make_key(key)
+        self.shared.delete(cache_key)
+        self.local.delete(cache_key)
+
+    def delete_many(self, keys):
+        cache_keys = [self.make_key(key) for key in keys]
+        if not cache_keys:
+            return
+        self.shared.delete_many(cache_keys)
+        for cache_key in cache_keys:
+            self.local.delete(cache_key)
+
+    def delete_local_where(self, predicate):
+        self.local.delete_where(predicate)
+
+    def clear_local(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        local = self._local
+        return {
+            "hits": self.hits + self.shared_hits,
+            "local_hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": local.evictions if local is not None else 0,
+            "expirations": local.expirations if local is not None else 0,
+            "local_size": len(local) if local is not None else 0,
+        }
+
+
+registry: dict[str, TieredCache] = {}
+
+
+def get_cache_stats() -> dict[str, dict]:
+    """
+    Hit/miss/eviction counters of every auth cache in this process, keyed by entity.
+    """
+    return {entity: tiered.stats() for entity, tiered in registry.items()}
+
+
+class UserCache:
+    """
+    Cache of GetUserData payloads, keyed by user id (AUTH_USER_CACHE_TTL, 60s by default).
+
+    Entries record how long the RPC that produced them took. Readers treat an
+    entry as missing slightly before it expires, with a probability that grows
+    as expiry approaches (XFetch). One caller refreshes early while the others
+    keep being served the cached value, so expiry does not synchronise misses.
+    """
+
+    def __init__(self):
+        self.store = TieredCache("user", ttl=60, fresh_for=self._fresh_for)
+
+    @property
+    def beta(self):
+        return getattr(settings, "AUTH_CACHE_EARLY_REFRESH_BETA", 1.0)
+
+    @staticmethod
+    def _fresh_for(entry):
+        return entry["expires_at"] - time.time()
+
+    def _unwrap(self, entry):
+        if entry is None:
+            return None
+        if self.beta > 0 and time.time() - entry["delta"] * self.beta * math.log(random.random() or 1e-12) \
+                >= entry["expires_at"]:
+            return None
+        return entry["data"]
+
+    def _wrap(self, user_data, delta):
+        return {"data": user_data, "delta": delta, "expires_at": time.time() + self.store.ttl}
+
+    def _unwrap_many(self, entries):
+        users_data = {int(user_id): self._unwrap(entry) for user_id, entry in entries.items()}
+        return {user_id: user_data for user_id, user_data in users_data.items() if user_data is not None}
+
+    def get(self, user_id):
+        return self._unwrap(self.store.get(int(user_id)))
+
+    def get_many(self, user_ids):
+        return self._unwrap_many(self.store.get_many([int(user_id) for user_id in user_ids]))
+
+    def set(self, user_id, user_data, delta=0):
+        self.store.set(int(user_id), self._wrap(user_data, delta))
+
+    def set_many(self, users_data, delta=0):
+        self.store.set_many({int(user_id): self._wrap(user_data, delta) for user_id, user_data in users_data.items()})
+
+    def delete(self, user_id):
+        self.store.delete(int(user_id))
+
+    async def aget(self, user_id):
+        return self._unwrap(await self.store.aget(int(user_id)))
+
+    async def aget_many(self, user_ids):
+        return self._unwrap_many(await self.store.aget_many([int(user_id) for user_id in user_ids]))
+
+    async def aset(self, user_id, user_data, delta=0):
+        await self.store.aset(int(user_id), self._wrap(user_data, delta))
+
+    async def aset_many(self, users_data, delta=0):
+        await self.store.aset_many({int(user_id): self._wrap(user_data, delta)
+                                    for user_id, user_data in users_data.items()})
+
+
+user_cache = UserCache()
+
+# GetRoles / GetDepartments responses (AUTH_ROLES_CACHE_TTL, AUTH_DEPARTMENTS_CACHE_TTL)
+roles_cache = TieredCache("roles", ttl=300)
+departments_cache = TieredCache("departments", ttl=300)
+
+# ids known to have a local user row, so authentication can skip the existence query (AUTH_USER_ROW_CACHE_TTL)
+user_row_cache = TieredCache("user_row", ttl=300)
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Caches VerifyLogin results keyed by a sha256 of the bearer token, never the raw token.
+
+    Lookups hit the in-process tier first and the shared tier second
+    (AUTH_TOKEN_CACHE_TTL, AUTH_TOKEN_CACHE_LOCAL_TTL, AUTH_TOKEN_CACHE_MAX_SIZE).
+    Rejected tokens are cached too (for a shorter time) so replaying a bad token
+    does not reach the auth server on every request.
+    """
+    revoked_user_prefix = "revoked_user_"
+    revoked_token_prefix = "revoked_token_"
+
+    def __init__(self):
+        self.store = TieredCache("token", ttl=30, fresh_for=self._fresh_for)
+
+    @property
+    def ttl(self):
+        return self.store.ttl
+
+    @property
+    def negative_ttl(self):
+        return getattr(settings, "AUTH_TOKEN_CACHE_NEGATIVE_TTL", 5)
+
+    @property
+    def local_ttl(self):
+        # bounds how long a token revoked in another process stays valid here
+        return self.store.local_ttl
+
+    @property
+    def degraded_max_age(self):
+        # how old a verified token may be and still be accepted while the auth server is down
+        if not getattr(settings, "AUTH_DEGRADED_MODE", False):
+            return 0
+        return getattr(settings, "AUTH_DEGRADED_TOKEN_MAX_AGE", 300)
+
+    @property
+    def local(self):
+        return self.store.local
+
+    def _fresh_for(self, entry):
+        if self.is_revoked(entry):
+            return 0
+        return entry["expires_at"] - time.time()
+
+    def get(self, token):
+        if self.ttl <= 0:
+            return None
+        return self.store.get(hash_token(token))
+
+    async def aget(self, token):
+        if self.ttl <= 0:
+            return None
+        return await self.store.aget(hash_token(token))
+
+    def is_revoked(self, entry):
+        if not entry["success"]:
+            return False
+        revoked_at = self.store.shared.get(self.store.make_key(f"{self.revoked_user_prefix}{entry['user_id']}"))
+        return revoked_at is not None and entry["verified_at"] <= revoked_at
+
+    def get_stale(self, token):
+        """
+        Returns a verified entry past its TTL but younger than AUTH_DEGRADED_TOKEN_MAX_AGE,
+        for degraded mode. Rejected and revoked entries are never served.
+        """
+        if self.ttl <= 0 or not self.degraded_max_age:
+            return None
+
+        entry = self.store.shared.get(self.store.make_key(hash_token(token)))
+        if (entry is None or not entry["success"]
+                or time.time() - entry["verified_at"] > self.degraded_max_age or self.is_revoked(entry)):
+            return None
+        return entry
+
+    def _set(self, token, entry, timeout):
+        if self.ttl <= 0 or timeout <= 0:
+            return entry
+        entry["expires_at"] = time.time() + timeout
+        # verified entries outlive their TTL in the shared tier so degraded mode can still use them
+        shared_timeout = max(timeout, self.degraded_max_age) if entry["success"] else timeout
+        self.store.set(hash_token(token), entry, timeout=timeout, shared_timeout=shared_timeout)
+        return entry
+
+    def set_verified(self, token, user_id, timeout=None, verified_at=None):
+        """
+        ``timeout`` caps the TTL, e.g. at the remaining lifetime of a locally verified JWT.
+        """
+        entry = {"success": True, "user_id": int(user_id), "verified_at": verified_at or time.time()}
+        return self._set(token, entry, self.ttl if timeout is None else min(self.ttl, timeout))
+
+    def set_rejected(self, token, detail=None, status_detail=None):
+        entry = {"success": False, "detail": detail, "status_detail": status_detail}
+        return self._set(token, entry, self.negative_ttl)
+
+    def invalidate(self, token):
+        self.store.delete(hash_token(token))
+
+    def revoke_user(self, user_id):
+        """
+        Invalidates every token verified so far for the user. Other processes
+        notice within AUTH_TOKEN_CACHE_LOCAL_TTL seconds.
+        """
+        user_id = int(user_id)
+        timeout = max(self.ttl, self.degraded_max_age, 1)
+        self.store.shared.set(self.store.make_key(f"{self.revoked_user_prefix}{user_id}"), time.time(),
+                              timeout=timeout)
+        self.store.delete_local_where(lambda entry: entry["success"] and entry["user_id"] == user_id)
+
+    def revoke_token(self, token, timeout):
+        """
+        Puts the token on the revocation list for ``timeout`` seconds, so it is
+        rejected even where it could be verified without the auth server.
+        """
+        self.invalidate(token)
+        if timeout > 0:
+            self.store.shared.set(self.store.make_key(f"{self.revoked_token_prefix}{hash_token(token)}"), True,
+                                  timeout=timeout)
+
+    def is_token_revoked(self, token):
+        return bool(self.store.shared.get(self.store.make_key(f"{self.revoked_token_prefix}{hash_token(token)}")))
+
+    def clear_local(self):
+        self.store.clear_local()
+
+
+token_cache = TokenCache()
+
+
+def invalidate_token(token: str):
+    """
+    Evicts a revoked token so the next request carrying it is verified against the auth server.
+    With local JWT verification enabled the token is also put on the revocation list.
+    """
+    if getattr(settings, "AUTH_LOCAL_JWT_VERIFICATION", False):
+        from .services.LocalVerification import token_lifetime
+        token_cache.revoke_token(token, token_lifetime(token))
+    else:
+        token_cache.invalidate(token)
@@ -0,0 +1,159 @@
+import logging
+import os
+import time
+from threading import Event, Lock, Thread
+
+from django.conf import settings
+
+from .exceptions import GRPC_Exception
+
+logger = logging.getLogger(__name__)
+
+# how soon a failed refresh is retried, capped by AUTH_CATALOG_REFRESH_INTERVAL
+RETRY_INTERVAL = 10
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the role and department catalogs, shaped for O(1) lookups.
+    """
+    __slots__ = ("roles", "departments", "department_access_levels", "loaded_at")
+
+    def __init__(self, roles=(), department_access_levels=None, loaded_at=None):
+        self.roles = frozenset(roles)
+        self.department_access_levels = dict(department_access_levels or {})
+        self.departments = frozenset(self.department_access_levels)
+        self.loaded_at = loaded_at
+
+    @classmethod
+    def from_responses(cls, roles, departments):
+        """
+        Builds a snapshot from GetRoles and GetDepartments responses as returned by AuthClient.
+        """
+        access_levels = {department["name"]: int(department.get("access_level") or 0)
+                         for department in departments.get("departments", [])}
+        return cls(roles.get("roles", []), access_levels, loaded_at=time.time())
+
+    def has_role(self, name):
+        return name in self.roles
+
+    def has_department(self, name):
+        return name in self.departments
+
+    def access_level(self, department, default=0):
+        return self.department_access_levels.get(department, default)
+
+
+class Catalog:
+    """
+    Process-local snapshot of the role and department catalogs.
+
+    Reads never make an RPC: the first access starts a daemon thread that loads
+    the snapshot, then refreshes it every ``AUTH_CATALOG_REFRESH_INTERVAL``
+    seconds, or as soon as ``schedule_refresh()`` is called (e.g. on an update
+    signal). Until the first load is done, reads wait for it, at most
+    ``AUTH_CATALOG_FIRST_LOAD_TIMEOUT`` seconds, then see an empty snapshot; a
+    failed refresh keeps serving the previous one.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._first_load = Event()
+        self._thread = None
+        self._started = False
+        self.last_error = None
+
+    @property
+    def refresh_interval(self):
+        return getattr(settings, "AUTH_CATALOG_REFRESH_INTERVAL", 300)
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        if not self._started:
+            with self._lock:
+                self._start()
+        if self._snapshot is None:
+            # a fresh worker must not answer permission checks from an empty catalog
+            self._first_load.wait(getattr(settings, "AUTH_CATALOG_FIRST_LOAD_TIMEOUT", 2.0))
+        return self._snapshot or EMPTY_SNAPSHOT
+
+    @property
+    def roles(self) -> frozenset:
+        return self.snapshot.roles
+
+    @property
+    def departments(self) -> frozenset:
+        return self.snapshot.departments
+
+    @property
+    def department_access_levels(self) -> dict:
+        return self.snapshot.department_access_levels
+
+    def refresh(self):
+        """
+        Reloads both catalogs from the auth server. Returns False if it failed.
+        """
+        from .grpc_client.client import AuthClient
+
+        try:
+            client = AuthClient()
+            snapshot = CatalogSnapshot.from_responses(client.get_roles(refresh=True),
+                                                      client.get_departments(refresh=True))
+        except GRPC_Exception as err:
+            logger.warning("Catalog refresh failed: %s", err.detail)
+            self.last_error = str(err.detail)
+            return False
+        except Exception as err:
+            logger.exception("Catalog refresh failed")
+            self.last_error = str(err)
+            return False
+        self._snapshot = snapshot
+        self.last_error = None
+        return True
+
+    def schedule_refresh(self):
+        """
+        Asks the background thread to refresh now, without waiting for it.
+        """
+        with self._lock:
+            self._start()
+        self._wakeup.set()
+
+    def _start(self):
+        self._started = True
+        needed = self._snapshot is None or self.refresh_interval > 0
+        if needed and (self._thread is None or not self._thread.is_alive()):
+            self._thread = Thread(target=self._worker, name="auth-service-catalog", daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        if self._snapshot is None:
+            self.refresh()
+        self._first_load.set()
+        while True:
+            interval = self.refresh_interval
+            if interval <= 0:
+                return
+            if self.last_error is not None:
+                interval = min(interval, RETRY_INTERVAL)
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            self.refresh()
+
+    def _reset_after_fork(self):
+        # the refresh thread does not survive fork, it is restarted on next access
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._first_load = Event()
+        self._thread = None
+        self._started = False
+
+
+EMPTY_SNAPSHOT = CatalogSnapshot()
+
+catalog = Catalog()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=catalog._reset_after_fork)
@@ -1,3 +1,5 @@
+import inspect
+
 import grpc
 
 
@@ -41,23 +43,45 @@ class GRPC_Value_Exception(GRPC_Exception):
         return details
 
 
+class CircuitOpenError(GRPC_Exception):
+    def __init__(self, detail="Auth service is unavailable"):
+        super().__init__(detail, status_code=503, status_detail="UNAVAILABLE")
+
+
+def convert_exception(err):
+    """
+    Maps gRPC and protobuf errors to GRPC_Exception; returns None for anything else.
+    """
+    if isinstance(err, grpc.RpcError):
+        status_code = err.code().value[0]
+        status_detail = err.code().name
+        detail = err.details()
+        return GRPC_Exception(status_code=status_code, status_detail=status_detail, detail=detail)
+
+    if isinstance(err, ValueError):
+        import re
+        error_text = err.__str__()
+        field_name = re.findall(r'"([^"]+)"', error_text)[0]
+        return GRPC_Value_Exception(field_name=field_name, detail=error_text)
+
+
 def try_except(func):
+    if inspect.iscoroutinefunction(func):
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except (grpc.RpcError, ValueError) as e:
+                raise convert_exception(e)
+
+        return async_wrapper
+
     def wrapper(*args, **kwargs):
 
         try:
             result = func(*args, **kwargs)
             return result
 
-        except grpc.RpcError as e:
-            status_code = e.code().value[0]
-            status_detail = e.code().name
-            detail = e.details()
-            raise GRPC_Exception(status_code=status_code, status_detail=status_detail, detail=detail)
-
-        except ValueError as e:
-            import re
-            error_text = e.__str__()
-            field_name = re.findall(r'"([^"]+)"', error_text)[0]
-            raise GRPC_Value_Exception(field_name=field_name, detail=error_text)
+        except (grpc.RpcError, ValueError) as e:
+            raise convert_exception(e)
 
     return wrapper
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import time
+import weakref
+from threading import Lock
+
+import grpc
+from django.conf import settings
+
+from . import auth_pb2, auth_pb2_grpc
+from .breaker import CircuitBreaker
+from .converters import message_to_dict, user_data_to_dict
+from .client import (get_batch_concurrency, get_channel_compression, get_channel_credentials, get_channel_options,
+                     get_filter_page_size, get_rpc_timeout, get_server_address)
+from .retry import RECONNECT_CODES
+from ..cache import departments_cache, roles_cache, user_cache
+from ..exceptions import CircuitOpenError, try_except
+
+
+class AsyncAuthClient:
+    """
+    asyncio counterpart of AuthClient, backed by grpc.aio channels.
+
+    A grpc.aio channel is bound to the event loop it was created in, so one
+    channel is kept per running loop and opened on first use in that loop.
+    """
+    _instance = None
+    _lock = Lock()
+    _service_name = None
+    _sub_service_name = None
+    _conn_address = None
+
+    def __new__(cls):
+        server_address = getattr(settings, "AUTH_GRPC_ADDRESS", "localhost")
+        service_name = getattr(settings, "SERVICE_NAME", None)
+        sub_service_name = getattr(settings, "SUB_SERVICE_NAME", None)
+
+        if not server_address:
+            raise Exception("Define AUTH_GRPC_ADDRESS in django settings")
+        if not service_name:
+            raise Exception("Define SERVICE_NAME in django settings")
+        if not sub_service_name:
+            raise Exception("Define SUB_SERVICE_NAME in django settings")
+
+        cls._service_name = service_name
+        cls._sub_service_name = sub_service_name
+        cls._conn_address = get_server_address(server_address)
+
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(AsyncAuthClient, cls).__new__(cls)
+                cls._instance._loop_stubs = weakref.WeakKeyDictionary()
+                cls._instance.breaker = CircuitBreaker.from_settings()
+
+        return cls._instance
+
+    @property
+    def stub(self):
+        loop = asyncio.get_running_loop()
+        if (entry := self._loop_stubs.get(loop)) is None:
+            channel = grpc.aio.secure_channel(self._conn_address, get_channel_credentials(),
+                                              options=get_channel_options(), compression=get_channel_compression())
+            entry = self._loop_stubs[loop] = (channel, auth_pb2_grpc.AuthServiceStub(channel))
+        return entry[1]
+
+    async def _call(self, name, request):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Auth service is unavailable, {name} was not attempted")
+
+        started = time.monotonic()
+        try:
+            result = await getattr(self.stub, name)(request, timeout=get_rpc_timeout(name))
+        except grpc.RpcError as e:
+            if e.code() in RECONNECT_CODES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success(time.monotonic() - started)
+            raise
+        except Exception:
+            self.breaker.record_success(time.monotonic() - started)
+            raise
+        except BaseException:
+            # e.g. asyncio.CancelledError
+            self.breaker.record_abandoned()
+            raise
+        self.breaker.record_success(time.monotonic() - started)
+        return result
+
+    @classmethod
+    def _reset_after_fork(cls):
+        cls._lock = Lock()
+        if cls._instance is not None:
+            cls._instance._loop_stubs = weakref.WeakKeyDictionary()
+            cls._instance.breaker = CircuitBreaker.from_settings()
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        if (entry := self._loop_stubs.pop(loop, None)) is not None:
+            await entry[0].close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @try_except
+    async def get_user_data(self, **kwargs) -> dict:
+        if user_id := kwargs.get("id"):
+            if user_data := await user_cache.aget(user_id):
+                return user_data
+
+        request = auth_pb2.UserQuery(service__name=self.service_name, sub_service__name=self.sub_service_name, **kwargs)
+        started = time.monotonic()
+        result = await self._call("GetUserData", request)
+        dict_result = message_to_dict(result)
+        await user_cache.aset(dict_result['id'], dict_result, delta=time.monotonic() - started)
+        return dict_result
+
+    @try_except
+    async def get_users_data(self, ids) -> dict[int, dict]:
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in ids))
+        users_data = await user_cache.aget_many(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in users_data]
+
+        concurrency = max(1, get_batch_concurrency())
+        for start in range(0, len(missing), concurrency):
+            chunk = missing[start:start + concurrency]
+            started = time.monotonic()
+            results = await asyncio.gather(*(self._fetch_user_data(user_id) for user_id in chunk))
+            fetched = {user_id: user_data for user_id, user_data in zip(chunk, results) if user_data is not None}
+            if fetched:
+                await user_cache.aset_many(fetched, delta=time.monotonic() - started)
+                users_data.update(fetched)
+        return {user_id: users_data[user_id] for user_id in user_ids if user_id in users_data}
+
+    async def _fetch_user_data(self, user_id):
+        request = auth_pb2.UserQuery(service__name=self.service_name, sub_service__name=self.sub_service_name,
+                                     id=user_id)
+        try:
+            return message_to_dict(await self._call("GetUserData", request))
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            return None
+
+    @try_except
+    async def filter_user(self, serialized=False, raw=False, **kwargs) -> dict[str, list[str]]:
+        """
+        ``raw=True`` returns the UserIds / UserDataList message itself, skipping the dict conversion.
+        """
+        request = auth_pb2.UserQuery(service__name=self.service_name, sub_service__name=self.sub_service_name, **kwargs)
+        if serialized:
+            result = await self._call("FilterUserSerialized", request)
+        else:
+            result = await self._call("FilterUser", request)
+        return result if raw else message_to_dict(result)
+
+    async def iter_user_ids(self, page_size=None, **filters):
+        page_size = page_size or get_filter_page_size()
+        user_ids = (await self.filter_user(raw=True, **filters)).user_id
+        for start in range(0, len(user_ids), page_size):
+            yield list(user_ids[start:start + page_size])
+
+    async def iter_user_pages(self, page_size=None, **filters):
+        page_size = page_size or get_filter_page_size()
+        users = (await self.filter_user(serialized=True, raw=True, **filters)).users
+        for start in range(0, len(users), page_size):
+            page = {user.id: user_data_to_dict(user) for user in users[start:start + page_size]}
+            await user_cache.aset_many(page)
+            yield page
+
+    async def iter_users(self, page_size=None, **filters):
+        async for page in self.iter_user_pages(page_size, **filters):
+            for user_data in page.values():
+                yield user_data
+
+    @try_except
+    async def verify_login(self, token: str) -> dict:
+        request = auth_pb2.VerifyLoginRequest(service_name=self.service_name,
+                                              sub_service_name=self.sub_service_name, token=token)
+        result = await self._call("VerifyLogin", request)
+        return message_to_dict(result)
+
+    @try_except
+    async def get_roles(self, refresh=False):
+        if not refresh and (roles := await roles_cache.aget("all")) is not None:
+            return roles
+        request = auth_pb2.GetRolesRequest()
+        result = await self._call("GetRoles", request)
+        roles = message_to_dict(result)
+        await roles_cache.aset("all", roles)
+        return roles
+
+    @try_except
+    async def get_departments(self, refresh=False):
+        if not refresh and (departments := await departments_cache.aget("all")) is not None:
+            return departments
+        request = auth_pb2.GetDepartmentsRequest()
+        result = await self._call("GetDepartments", request)
+        departments = message_to_dict(result)
+        await departments_cache.aset("all", departments)
+        return departments
+
+    @try_except
+    async def create_user(self, national_id: str, first_name: str, last_name: str, username: str, phone: str,
+                          email: str, is_active: bool, roles_name: list[str], department_names: list[str]):
+        request = auth_pb2.CreateUserRequest(
+            service_name=self.service_name,
+            sub_service_name=self.sub_service_name,
+            national_id=national_id,
+            first_name=first_name,
+            last_name=last_name,
+            username=username,
+            phone=phone,
+            email=email,
+            is_active=is_active,
+            roles_name=roles_name,
+            department_names=department_names
+        )
+        result = await self._call("CreateUser", request)
+        return message_to_dict(result)
+
+    @try_except
+    async def update_user(self, id: int = None, national_id: str = None, first_name: str = None,
+                          last_name: str = None, username: str = None, phone: str = None, email: str = None,
+                          is_active: bool = None):
+        request = auth_pb2.UpdateUserRequest(
+            service_name=self.service_name,
+            sub_service_name=self.sub_service_name,
+            id=id,
+            national_id=national_id,
+            first_name=first_name,
+            last_name=last_name,
+            username=username,
+            phone=phone,
+            email=email,
+            is_active=is_active
+        )
+        result = await self._call("UpdateUser", request)
+        dict_result = message_to_dict(result)
+        await user_cache.aset(dict_result['id'], dict_result)
+        return dict_result
+
+    @property
+    def service_name(self):
+        return self._service_name
+
+    @property
+    def sub_service_name(self):
+        return self._sub_service_name
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=AsyncAuthClient._reset_after_fork)
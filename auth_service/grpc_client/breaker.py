@@ -0,0 +1,112 @@
+import time
+from collections import deque
+from threading import Lock
+
+from django.conf import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the auth server looks unhealthy.
+
+    The breaker opens after ``failure_threshold`` consecutive failures, or when
+    the ``latency_percentile`` of the last ``window`` call latencies exceeds
+    ``latency_threshold`` seconds. After ``reset_timeout`` seconds a single
+    probe call is let through: success closes the breaker, failure reopens it.
+    A probe that never reports back is replaced by a new one after another
+    ``reset_timeout`` seconds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, latency_threshold=None,
+                 latency_percentile=0.95, window=100):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_threshold = latency_threshold
+        self.latency_percentile = latency_percentile
+        self._latencies = deque(maxlen=window)
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = None
+        self._probing = False
+        self._probe_started_at = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            failure_threshold=getattr(settings, "AUTH_GRPC_BREAKER_FAILURES", 5),
+            reset_timeout=getattr(settings, "AUTH_GRPC_BREAKER_RESET_TIMEOUT", 30.0),
+            latency_threshold=getattr(settings, "AUTH_GRPC_BREAKER_LATENCY_THRESHOLD", None),
+            latency_percentile=getattr(settings, "AUTH_GRPC_BREAKER_LATENCY_PERCENTILE", 0.95),
+            window=getattr(settings, "AUTH_GRPC_BREAKER_WINDOW", 100),
+        )
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def is_open(self):
+        return self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN and (not self._probing
+                                             or time.monotonic() - self._probe_started_at >= self.reset_timeout):
+                self._probing = True
+                self._probe_started_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, latency):
+        with self._lock:
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._close()
+                return
+            self._latencies.append(latency)
+            if self._latency_exceeded():
+                self._open()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def record_abandoned(self):
+        """
+        The call ended without an outcome (cancelled, or failed before reaching
+        the server): a pending probe is released so the next call can probe.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+
+    def _latency_exceeded(self):
+        if self.latency_threshold is None or len(self._latencies) < self._latencies.maxlen:
+            return False
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.latency_percentile))
+        return latencies[index] > self.latency_threshold
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self._latencies.clear()
+
+    def _close(self):
+        self._state = CLOSED
+        self._failures = 0
+        self._probing = False
+        self._latencies.clear()
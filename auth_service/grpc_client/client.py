@@ -1,21 +1,119 @@
+import os
+import time
+
 import grpc
-from . import auth_pb2, auth_pb2_grpc
+from . import auth_pb2
+from .breaker import CircuitBreaker
+from .converters import message_to_dict, user_data_to_dict
+from .pool import ChannelPool, ROUND_ROBIN
+from .retry import RECONNECT_CODES, RetryPolicy
+from .singleflight import SingleFlight
 from threading import Lock
 from pathlib import Path
-from google.protobuf.json_format import MessageToDict
 from django.conf import settings
-from django.core.cache import cache
 import atexit
 
-from ..exceptions import try_except
+from ..cache import departments_cache, roles_cache, user_cache
+from ..exceptions import CircuitOpenError, try_except
+
+
+DEFAULT_PORT = 50051
+
+DEFAULT_CHANNEL_OPTIONS = {
+    # detect dead connections while calls are in flight. A grpc server rejects pings on idle
+    # connections unless it permits them (GRPC_ARG_KEEPALIVE_PERMIT_WITHOUT_CALLS) and answers
+    # repeated violations with GOAWAY "too_many_pings", so idle pings are opt-in through
+    # AUTH_GRPC_CHANNEL_OPTIONS once the server allows them
+    "grpc.keepalive_time_ms": 300000,
+    "grpc.keepalive_timeout_ms": 20000,
+    "grpc.keepalive_permit_without_calls": 0,
+    "grpc.http2.max_pings_without_data": 0,
+    # FilterUserSerialized responses can outgrow the 4MB default
+    "grpc.max_receive_message_length": 64 * 1024 * 1024,
+    "grpc.max_send_message_length": 16 * 1024 * 1024,
+}
 
+COMPRESSION_ALGORITHMS = {
+    None: None,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
 
-def get_secure_channel(server_domain):
+_credentials_cache = {}
+_credentials_lock = Lock()
+
+
+def get_channel_credentials():
+    """
+    Returns the TLS channel credentials, re-reading the certificate only when its mtime changes.
+    """
     cert_path = getattr(settings, 'AUTH_CERT_FILE_PATH', 'authservice.pem')
-    with open(cert_path, "rb") as f:
-        trusted_certs = f.read()
-    credentials = grpc.ssl_channel_credentials(root_certificates=trusted_certs)
-    return grpc.secure_channel(f"{server_domain}:50051", credentials)
+    mtime = os.stat(cert_path).st_mtime_ns
+
+    with _credentials_lock:
+        cached = _credentials_cache.get(cert_path)
+        if cached is None or cached[0] != mtime:
+            with open(cert_path, "rb") as f:
+                trusted_certs = f.read()
+            cached = _credentials_cache[cert_path] = (mtime, grpc.ssl_channel_credentials(root_certificates=trusted_certs))
+    return cached[1]
+
+
+def get_server_address(server_address=None):
+    """
+    Returns AUTH_GRPC_ADDRESS as host:port, adding the default port only when none is given.
+    """
+    server_address = server_address or getattr(settings, "AUTH_GRPC_ADDRESS", "localhost")
+    if server_address.startswith("["):
+        has_port = "]:" in server_address
+    else:
+        has_port = server_address.count(":") == 1
+    return server_address if has_port else f"{server_address}:{DEFAULT_PORT}"
+
+
+def get_channel_options(extra_options=None):
+    """
+    Merges DEFAULT_CHANNEL_OPTIONS with AUTH_GRPC_CHANNEL_OPTIONS, e.g. to tune keepalive,
+    message sizes or HTTP/2 windows ("grpc.http2.lookahead_bytes", "grpc.http2.bdp_probe").
+    """
+    options = {**DEFAULT_CHANNEL_OPTIONS, **getattr(settings, "AUTH_GRPC_CHANNEL_OPTIONS", {}), **(extra_options or {})}
+    return list(options.items())
+
+
+def get_channel_compression():
+    compression = getattr(settings, "AUTH_GRPC_COMPRESSION", None)
+    if compression not in COMPRESSION_ALGORITHMS:
+        raise Exception(f"AUTH_GRPC_COMPRESSION must be one of {[name for name in COMPRESSION_ALGORITHMS if name]}")
+    return COMPRESSION_ALGORITHMS[compression]
+
+
+def get_secure_channel(server_address, extra_options=None):
+    return grpc.secure_channel(get_server_address(server_address), get_channel_credentials(),
+                               options=get_channel_options(extra_options), compression=get_channel_compression())
+
+
+def get_rpc_timeout(method):
+    timeouts = getattr(settings, "AUTH_GRPC_TIMEOUTS", {})
+    return timeouts.get(method, getattr(settings, "AUTH_GRPC_TIMEOUT", 5.0))
+
+
+def get_filter_page_size():
+    return getattr(settings, "AUTH_FILTER_PAGE_SIZE", 500)
+
+
+def get_batch_concurrency():
+    return getattr(settings, "AUTH_BATCH_CONCURRENCY", 16)
+
+
+def iter_user_data_pages(users, page_size):
+    """
+    Converts UserData messages into ``{id: user_data}`` pages of at most
+    ``page_size`` users, caching each page when it is reached.
+    """
+    for start in range(0, len(users), page_size):
+        page = {user.id: user_data_to_dict(user) for user in users[start:start + page_size]}
+        user_cache.set_many(page)
+        yield page
 
 
 class AuthClient:
@@ -39,46 +137,89 @@ class AuthClient:
 
         cls._service_name = service_name
         cls._sub_service_name = sub_service_name
-        cls._conn_address = f"{server_address}:50051"
+        cls._conn_address = get_server_address(server_address)
 
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(AuthClient, cls).__new__(cls)
-                cls._instance._create_channel()
+                cls._instance._pool = None
+                cls._instance.breaker = CircuitBreaker.from_settings()
+                cls._instance.single_flight = SingleFlight()
+                cls._instance.stub = cls._instance._wrap_stub()
 
         return cls._instance
 
+    @property
+    def pool(self):
+        """
+        The channel pool is opened on first use, never at import or construction time.
+        """
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._create_channel()
+        return self._pool
+
     def _create_channel(self):
-        server_domain = self._conn_address.split(":")[0]
-        self.channel = get_secure_channel(server_domain)
-        self.stub = self._wrap_stub(auth_pb2_grpc.AuthServiceStub(self.channel))
+        pool_size = getattr(settings, "AUTH_GRPC_CHANNEL_POOL_SIZE", 1)
+        strategy = getattr(settings, "AUTH_GRPC_CHANNEL_POOL_STRATEGY", ROUND_ROBIN)
+
+        def channel_factory(index):
+            # channels to the same target share connections unless each one has its own subchannel pool
+            options = {"grpc.use_local_subchannel_pool": 1} if pool_size > 1 else None
+            return get_secure_channel(self._conn_address, extra_options=options)
 
-    def _wrap_stub(self, stub):
+        self._pool = ChannelPool(channel_factory, size=pool_size, strategy=strategy,
+                                 min_replace_interval=getattr(settings, "AUTH_GRPC_RECONNECT_MIN_INTERVAL", 1.0))
+
+    def _wrap_stub(self):
         """
-        Wraps each method of the stub to auto-reset channel on specific errors.
+        Wraps each stub method to run on a pooled channel, replace the channel on
+        connection errors and retry idempotent RPCs with backoff.
         """
-        class SafeStub:
-            def __init__(safe_self):
-                safe_self._stub = stub
+        retry_policy = RetryPolicy()
 
+        class SafeStub:
             def __getattr__(safe_self, name):
-                func = getattr(safe_self._stub, name)
 
                 def wrapped(*args, **kwargs):
-                    try:
-                        return func(*args, **kwargs)
-                    except grpc.RpcError as e:
-                        if e.code() in (
-                            grpc.StatusCode.UNAVAILABLE,
-                            grpc.StatusCode.INTERNAL,
-                            grpc.StatusCode.DEADLINE_EXCEEDED,
-                            grpc.StatusCode.UNKNOWN,
-                        ):
-                            # Reconnect
-                            self._create_channel()
-                            func_retry = getattr(self.stub, name)
-                            return func_retry(*args, **kwargs)
-                        raise  # Raise other unexpected errors
+                    if not self.breaker.allow():
+                        raise CircuitOpenError(f"Auth service is unavailable, {name} was not attempted")
+
+                    kwargs.setdefault("timeout", get_rpc_timeout(name))
+                    retry_policy.budget.deposit()
+                    attempt = 0
+                    while True:
+                        try:
+                            slot = self.pool.acquire()
+                        except BaseException:
+                            self.breaker.record_abandoned()
+                            raise
+                        started = time.monotonic()
+                        try:
+                            result = getattr(slot.stub, name)(*args, **kwargs)
+                            self.breaker.record_success(time.monotonic() - started)
+                            return result
+                        except grpc.RpcError as e:
+                            if not retry_policy.should_reconnect(e):
+                                # the server answered, so it is up
+                                self.breaker.record_success(time.monotonic() - started)
+                                raise  # Raise other unexpected errors
+                            self.breaker.record_failure()
+                            # only the first caller failing on this channel rebuilds it
+                            self.pool.replace(slot)
+                            if not retry_policy.should_retry(name, e, attempt) or not self.breaker.allow():
+                                raise
+                        except Exception:
+                            self.breaker.record_success(time.monotonic() - started)
+                            raise
+                        except BaseException:
+                            self.breaker.record_abandoned()
+                            raise
+                        finally:
+                            self.pool.release(slot)
+                        retry_policy.sleep(attempt)
+                        attempt += 1
                 return wrapped
         return SafeStub()
 
@@ -86,50 +227,196 @@ class AuthClient:
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.channel.close()
+        self.close()
 
     def close(self):
-        self.channel.close()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # channels inherited from the parent must not be used or closed in the child
+        cls._lock = Lock()
+        if cls._instance is not None:
+            cls._instance._pool = None
+            cls._instance.breaker = CircuitBreaker.from_settings()
+            cls._instance.single_flight = SingleFlight()
 
     @try_except
     def get_user_data(self, **kwargs) -> dict:
         if user_id := kwargs.get("id"):
-            if user_data := cache.get(f"user_id_{user_id}"):
+            if user_data := user_cache.get(user_id):
                 return user_data
 
+        # concurrent misses for the same query share one RPC
+        return self.single_flight.do(("GetUserData", repr(sorted(kwargs.items()))), self._fetch_user_data, **kwargs)
+
+    def prefetch_user_data(self, user_id):
+        """
+        Starts GetUserData for ``user_id`` without waiting for it and returns a
+        callable that does. The callable returns the user data, cached on arrival,
+        or None if the speculative call failed, in which case callers fall back
+        to get_user_data (which has retries).
+        """
+        if self.breaker.is_open:
+            return lambda: None
+
+        request = auth_pb2.UserQuery(service__name=self.service_name, sub_service__name=self.sub_service_name,
+                                     id=int(user_id))
+        slot = self.pool.acquire()
+        started = time.monotonic()
+        try:
+            future = slot.stub.GetUserData.future(request, timeout=get_rpc_timeout("GetUserData"))
+        except Exception:
+            self.pool.release(slot)
+            return lambda: None
+        future.add_done_callback(lambda _: self.pool.release(slot))
+
+        def result():
+            try:
+                user_data = message_to_dict(future.result())
+            except grpc.RpcError:
+                return None
+            user_cache.set(user_id, user_data, delta=time.monotonic() - started)
+            return user_data
+        return result
+
+    def _fetch_user_data(self, **kwargs) -> dict:
         request = auth_pb2.UserQuery(service__name=self.service_name, sub_service__name=self.sub_service_name, **kwargs)
+        started = time.monotonic()
         result = self.stub.GetUserData(request)
-        dict_result = MessageToDict(result, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
-        cache_key = f"user_id_{dict_result['id']}"
-        if cache_key:
-            cache.set(cache_key, dict_result, timeout=60)
+        dict_result = message_to_dict(result)
+        user_cache.set(dict_result['id'], dict_result, delta=time.monotonic() - started)
         return dict_result
 
     @try_except
-    def filter_user(self, serialized=False, **kwargs) -> dict[str, list[str]]:
+    def get_users_data(self, ids) -> dict[int, dict]:
+        """
+        Resolves many users: cached users come from ``user_cache.get_many`` and the misses
+        from GetUserData calls, at most AUTH_BATCH_CONCURRENCY of them in flight at a time.
+        Returns user data keyed by id, in input order; unknown ids are left out.
+        """
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in ids))
+        users_data = user_cache.get_many(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in users_data]
+
+        concurrency = max(1, get_batch_concurrency())
+        for start in range(0, len(missing), concurrency):
+            chunk = missing[start:start + concurrency]
+            started = time.monotonic()
+            fetched = self._fetch_users_data(chunk)
+            if fetched:
+                user_cache.set_many(fetched, delta=time.monotonic() - started)
+                users_data.update(fetched)
+        return {user_id: users_data[user_id] for user_id in user_ids if user_id in users_data}
+
+    def _fetch_users_data(self, user_ids) -> dict[int, dict]:
+        """
+        Sends one GetUserData per id concurrently over the pool. A call that fails on
+        a connection error is repeated through the stub, which retries.
+        """
+        if self.breaker.is_open:
+            raise CircuitOpenError("Auth service is unavailable, GetUserData was not attempted")
+
+        calls = {}
+        for user_id in user_ids:
+            request = auth_pb2.UserQuery(service__name=self.service_name, sub_service__name=self.sub_service_name,
+                                         id=user_id)
+            slot = self.pool.acquire()
+            try:
+                future = slot.stub.GetUserData.future(request, timeout=get_rpc_timeout("GetUserData"))
+            except Exception:
+                self.pool.release(slot)
+                raise
+            future.add_done_callback(lambda _, slot=slot: self.pool.release(slot))
+            calls[user_id] = (request, future)
+
+        fetched = {}
+        for user_id, (request, future) in calls.items():
+            try:
+                try:
+                    result = future.result()
+                except grpc.RpcError as e:
+                    if e.code() not in RECONNECT_CODES:
+                        raise
+                    result = self.stub.GetUserData(request)
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.NOT_FOUND:
+                    raise
+                continue
+            fetched[user_id] = message_to_dict(result)
+        return fetched
+
+    @try_except
+    def filter_user(self, serialized=False, raw=False, **kwargs) -> dict[str, list[str]]:
+        """
+        ``raw=True`` returns the UserIds / UserDataList message itself, skipping the dict conversion.
+        """
         request = auth_pb2.UserQuery(service__name=self.service_name, sub_service__name=self.sub_service_name, **kwargs)
         if serialized:
             result = self.stub.FilterUserSerialized(request)
         else:
             result = self.stub.FilterUser(request)
-        return MessageToDict(result, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
+        return result if raw else message_to_dict(result)
+
+    def iter_user_ids(self, page_size=None, **filters):
+        """
+        Yields the ids of the users matching ``filters`` in lists of at most
+        ``page_size`` (AUTH_FILTER_PAGE_SIZE) ids.
+
+        The auth server has no paginated or streaming filter RPC, so the ids
+        arrive in one FilterUser response, but only one page at a time is
+        turned into Python objects.
+        """
+        page_size = page_size or get_filter_page_size()
+        user_ids = self.filter_user(raw=True, **filters).user_id
+        for start in range(0, len(user_ids), page_size):
+            yield list(user_ids[start:start + page_size])
+
+    def iter_user_pages(self, page_size=None, **filters):
+        """
+        Yields the users matching ``filters`` as ``{id: user_data}`` pages of at
+        most ``page_size`` users. Each page is converted and cached only when it
+        is reached, so the full result is never held as dicts.
+        """
+        users = self.filter_user(serialized=True, raw=True, **filters).users
+        yield from iter_user_data_pages(users, page_size or get_filter_page_size())
+
+    def iter_users(self, page_size=None, **filters):
+        for page in self.iter_user_pages(page_size, **filters):
+            yield from page.values()
 
     @try_except
     def verify_login(self, token: str) -> dict:
+        return self.single_flight.do(("VerifyLogin", token), self._verify_login, token)
+
+    def _verify_login(self, token: str) -> dict:
         request = auth_pb2.VerifyLoginRequest(service_name=self.service_name,
                                               sub_service_name=self.sub_service_name, token=token)
         result = self.stub.VerifyLogin(request)
-        return MessageToDict(result, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
+        return message_to_dict(result)
 
-    def get_roles(self):
+    @try_except
+    def get_roles(self, refresh=False):
+        if not refresh and (roles := roles_cache.get("all")) is not None:
+            return roles
         request = auth_pb2.GetRolesRequest()
         result = self.stub.GetRoles(request)
-        return MessageToDict(result, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
+        roles = message_to_dict(result)
+        roles_cache.set("all", roles)
+        return roles
 
-    def get_departments(self):
+    @try_except
+    def get_departments(self, refresh=False):
+        if not refresh and (departments := departments_cache.get("all")) is not None:
+            return departments
         request = auth_pb2.GetDepartmentsRequest()
         result = self.stub.GetDepartments(request)
-        return MessageToDict(result, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
+        departments = message_to_dict(result)
+        departments_cache.set("all", departments)
+        return departments
 
     @try_except
     def create_user(self, national_id: str, first_name: str, last_name: str, username: str, phone: str, email: str,
@@ -149,7 +436,7 @@ class AuthClient:
             department_names=department_names
         )
         result = self.stub.CreateUser(request)
-        return MessageToDict(result, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
+        return message_to_dict(result)
 
     @try_except
     def update_user(self, id: int = None, national_id: str = None, first_name: str = None, last_name: str = None,
@@ -167,10 +454,8 @@ class AuthClient:
             is_active=is_active
         )
         result = self.stub.UpdateUser(request)
-        dict_result = MessageToDict(result, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
-        cache_key = f"user_id_{dict_result['id']}"
-        if cache_key:
-            cache.set(cache_key, dict_result, timeout=60)
+        dict_result = message_to_dict(result)
+        user_cache.set(dict_result['id'], dict_result)
         return dict_result
 
     @property
@@ -182,9 +467,18 @@ class AuthClient:
         return self._sub_service_name
 
 
-client = AuthClient()
+def _reset_after_fork():
+    global _credentials_lock
+    _credentials_lock = Lock()
+    _credentials_cache.clear()
+    AuthClient._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 @atexit.register
 def cleanup():
-    client.close()
+    if AuthClient._instance is not None:
+        AuthClient._instance.close()
@@ -0,0 +1,79 @@
+"""
+Direct field extraction for the messages on hot paths.
+
+The output equals ``MessageToDict(message, preserving_proto_field_name=True,
+always_print_fields_with_no_presence=True)`` (int64 values as strings included),
+without walking descriptors. Other messages fall back to MessageToDict.
+"""
+from google.protobuf.json_format import MessageToDict
+
+from . import auth_pb2
+
+
+def service_to_dict(service) -> dict:
+    return {"name": service.name, "domain": service.domain}
+
+
+def sub_service_to_dict(sub_service) -> dict:
+    result = {
+        "id": str(sub_service.id),
+        "name": sub_service.name,
+        "domain": sub_service.domain,
+        "access_type": sub_service.access_type,
+        "access_id": str(sub_service.access_id),
+    }
+    # optional fields are left out when unset, like MessageToDict does
+    if sub_service.HasField("pname"):
+        result["pname"] = sub_service.pname
+    if sub_service.HasField("description"):
+        result["description"] = sub_service.description
+    return result
+
+
+def user_data_to_dict(user) -> dict:
+    result = {"id": str(user.id)}
+    if user.HasField("service"):
+        result["service"] = service_to_dict(user.service)
+    result.update({
+        "sub_services": [sub_service_to_dict(sub_service) for sub_service in user.sub_services],
+        "national_id": user.national_id,
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "phone": user.phone,
+        "email": user.email,
+        "image": user.image,
+        "departments": list(user.departments),
+        "roles": list(user.roles),
+        "is_active": user.is_active,
+        "is_superuser": user.is_superuser,
+        "is_staff": user.is_staff,
+        "access_level": str(user.access_level),
+    })
+    return result
+
+
+def user_data_list_to_dict(user_list) -> dict:
+    return {"users": [user_data_to_dict(user) for user in user_list.users]}
+
+
+def user_ids_to_dict(user_ids) -> dict:
+    return {"user_id": [str(user_id) for user_id in user_ids.user_id]}
+
+
+def verify_login_to_dict(response) -> dict:
+    return {"success": response.success, "user_id": str(response.user_id)}
+
+
+CONVERTERS = {
+    auth_pb2.UserData.DESCRIPTOR.full_name: user_data_to_dict,
+    auth_pb2.UserDataList.DESCRIPTOR.full_name: user_data_list_to_dict,
+    auth_pb2.UserIds.DESCRIPTOR.full_name: user_ids_to_dict,
+    auth_pb2.VerifyLoginResponse.DESCRIPTOR.full_name: verify_login_to_dict,
+}
+
+
+def message_to_dict(message) -> dict:
+    if converter := CONVERTERS.get(message.DESCRIPTOR.full_name):
+        return converter(message)
+    return MessageToDict(message, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
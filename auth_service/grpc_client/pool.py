@@ -0,0 +1,116 @@
+import itertools
+import time
+from threading import Lock
+
+import grpc
+
+from . import auth_pb2_grpc
+
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+
+
+class PooledChannel:
+    """
+    A channel of the pool together with its stub, in-flight call count and
+    last observed connectivity state.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.stub = auth_pb2_grpc.AuthServiceStub(channel)
+        self.in_flight = 0
+        self.state = None
+        self.closed = False
+        self.retired = False
+        self.created_at = time.monotonic()
+        channel.subscribe(self._on_state_change, try_to_connect=True)
+
+    def _on_state_change(self, state):
+        self.state = state
+
+    @property
+    def healthy(self):
+        return not self.closed and self.state not in (grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+                                                      grpc.ChannelConnectivity.SHUTDOWN)
+
+    @property
+    def dead(self):
+        return self.closed or self.state == grpc.ChannelConnectivity.SHUTDOWN
+
+    def close(self):
+        self.closed = True
+        try:
+            self.channel.unsubscribe(self._on_state_change)
+        except ValueError:
+            pass
+        self.channel.close()
+
+
+class ChannelPool:
+    """
+    Fixed-size pool of gRPC channels to the auth server.
+
+    Calls are spread over the channels round-robin or to the least loaded one.
+    Channels reported in TRANSIENT_FAILURE are skipped while a healthy one is
+    available, and channels found shut down are replaced on the spot.
+    """
+
+    def __init__(self, channel_factory, size=1, strategy=ROUND_ROBIN, min_replace_interval=1.0):
+        if strategy not in (ROUND_ROBIN, LEAST_LOADED):
+            raise ValueError(f'Unknown channel pool strategy "{strategy}"')
+        self._channel_factory = channel_factory
+        self._strategy = strategy
+        self._min_replace_interval = min_replace_interval
+        self._counter = itertools.count()
+        self._lock = Lock()
+        self._slots = [PooledChannel(channel_factory(index)) for index in range(max(1, size))]
+
+    def __len__(self):
+        return len(self._slots)
+
+    def acquire(self) -> PooledChannel:
+        with self._lock:
+            for index, slot in enumerate(self._slots):
+                if slot.dead:
+                    self._slots[index] = PooledChannel(self._channel_factory(index))
+
+            candidates = [slot for slot in self._slots if slot.healthy] or self._slots
+            if self._strategy == LEAST_LOADED:
+                slot = min(candidates, key=lambda candidate: candidate.in_flight)
+            else:
+                slot = candidates[next(self._counter) % len(candidates)]
+            slot.in_flight += 1
+        return slot
+
+    def release(self, slot):
+        with self._lock:
+            slot.in_flight -= 1
+            close = slot.retired and slot.in_flight == 0
+        if close:
+            slot.close()
+
+    def replace(self, slot):
+        """
+        Swaps a broken channel for a fresh one. The old channel is closed once
+        its in-flight calls have been released.
+
+        Concurrent callers failing on the same channel rebuild it only once, and
+        a channel younger than ``min_replace_interval`` is kept: if a fresh
+        channel fails too, the server is down and rebuilding will not help.
+        """
+        with self._lock:
+            if slot not in self._slots or time.monotonic() - slot.created_at < self._min_replace_interval:
+                return
+            index = self._slots.index(slot)
+            self._slots[index] = PooledChannel(self._channel_factory(index))
+            slot.retired = True
+            close = slot.in_flight == 0
+        if close:
+            slot.close()
+
+    def close(self):
+        with self._lock:
+            slots, self._slots = self._slots, []
+        for slot in slots:
+            slot.close()
@@ -0,0 +1,70 @@
+import random
+import time
+from threading import Lock
+
+import grpc
+from django.conf import settings
+
+# the only codes that say the server or the connection is unhealthy. UNKNOWN and INTERNAL are what
+# a handler raising on one bad input returns: they are answers, like NOT_FOUND, not outages
+RECONNECT_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+)
+
+# RPCs that must never be sent twice
+NON_IDEMPOTENT_METHODS = frozenset({"CreateUser"})
+
+
+class RetryBudget:
+    """
+    Token bucket that caps retries to a fraction of recent traffic, so an auth
+    server outage does not get multiplied by every retrying thread.
+
+    Every call deposits ``ratio`` tokens, every retry withdraws one, and the
+    bucket never holds more than ``max_tokens``.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed RPC is retried and how long to wait before the next attempt
+    (exponential backoff with full jitter).
+    """
+
+    def __init__(self):
+        self.max_retries = getattr(settings, "AUTH_GRPC_MAX_RETRIES", 2)
+        self.backoff = getattr(settings, "AUTH_GRPC_RETRY_BACKOFF", 0.05)
+        self.backoff_max = getattr(settings, "AUTH_GRPC_RETRY_BACKOFF_MAX", 1.0)
+        self.budget = RetryBudget(ratio=getattr(settings, "AUTH_GRPC_RETRY_BUDGET_RATIO", 0.2),
+                                  max_tokens=getattr(settings, "AUTH_GRPC_RETRY_BUDGET_MAX", 10))
+
+    @staticmethod
+    def should_reconnect(err):
+        return err.code() in RECONNECT_CODES
+
+    def should_retry(self, method, err, attempt):
+        return (method not in NON_IDEMPOTENT_METHODS
+                and err.code() in RECONNECT_CODES
+                and attempt < self.max_retries
+                and self.budget.withdraw())
+
+    def sleep(self, attempt):
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
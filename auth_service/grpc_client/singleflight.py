@@ -0,0 +1,44 @@
+from threading import Event, Lock
+
+
+class _Call:
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls: callers asking for the same key while a call
+    is in flight wait for it and share its result (or exception) instead of
+    issuing their own RPC.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
@@ -3,11 +3,22 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.db import connection
 
+from auth_service.sync import get_sync_batch_size, sync_users
 
 
 class Command(BaseCommand):
     help = 'Sync users from gRPC server'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help=f'Number of users created or deleted per transaction (default: {get_sync_batch_size()}).'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the changes without writing to the database.'
+        )
+
     def handle(self, *args, **options):
         if not getattr(settings, 'USER_DB_MODEL', False):
             self.stdout.write(self.style.WARNING("USER_DB_MODEL is disabled."))
@@ -29,21 +40,22 @@ class Command(BaseCommand):
 
             return
 
+        dry_run = options['dry_run']
+
+        def progress(action, count, totals):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{count} users {action} "
+                                  f"(total created: {totals['created']}, deleted: {totals['deleted']})")
+
         try:
-            from auth_service.grpc_client.client import AuthClient
-            client = AuthClient()
-            user_ids = client.filter_user().get('user_id')
-            new_user_ids = set(map(int, user_ids))
-            existing_user_ids = set(User.objects.values_list('id', flat=True))
-            diff = new_user_ids.difference(existing_user_ids)
-            reversed_diff = existing_user_ids.difference(new_user_ids)
-            for user_id in diff:
-                User.objects.create(id=user_id)
-            with connection.constraint_checks_disabled():
-                User.objects.filter(id__in=reversed_diff).delete()
-
-            self.stdout.write(self.style.SUCCESS(f"{len(diff)} new users synced."))
-            self.stdout.write(self.style.SUCCESS(f"{len(reversed_diff)} old users deleted."))
+            result = sync_users(batch_size=options['batch_size'], dry_run=dry_run, progress=progress)
+
+            prefix = "[dry-run] " if dry_run else ""
+            self.stdout.write(self.style.SUCCESS(f"{prefix}{result['created']} new users synced."))
+            self.stdout.write(self.style.SUCCESS(f"{prefix}{result['deleted']} old users deleted."))
+            if shadow := result.get('shadow'):
+                self.stdout.write(self.style.SUCCESS(f"{shadow['synced']} shadow rows synced, "
+                                                     f"{shadow['deleted']} removed."))
 
         except Exception as err:
             self.stderr.write("Error fetching users: " + str(err))
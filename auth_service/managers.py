@@ -1,32 +1,118 @@
 from django.contrib.auth.models import BaseUserManager
 from django.core.exceptions import FieldError
-from .grpc_client.client import AuthClient
+from django.db import models
+from .exceptions import GRPC_Exception
+from .grpc_client.client import AuthClient, get_filter_page_size
+from .shadow import shadow_user_ids
 
-client = AuthClient()
+
+def prefetch_remote_fields(users):
+    """
+    Hydrates the remote fields of many users with a single batched lookup,
+    instead of one GetUserData call per user.
+    """
+    pending = [user for user in users
+               if hasattr(user, 'load_remote_fields') and user.pk is not None
+               and not user.__dict__.get('_remote_fields_loaded')]
+    if not pending:
+        return users
+
+    try:
+        users_data = AuthClient().get_users_data([user.pk for user in pending])
+    except GRPC_Exception:
+        # the auth server is unavailable: every user keeps the lazy per-instance fallback
+        return users
+
+    for user in pending:
+        # users missing from the batch keep the lazy per-instance fallback
+        if user_data := users_data.get(int(user.pk)):
+            user.load_remote_fields(user_data)
+    return users
+
+
+class BaseAuthUserQuerySet(models.QuerySet):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._with_remote_fields = False
+
+    def with_remote_fields(self):
+        """
+        Like prefetch_related, but for the fields served by the auth server.
+        """
+        clone = self._chain()
+        clone._with_remote_fields = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._with_remote_fields = self._with_remote_fields
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._with_remote_fields:
+            prefetch_remote_fields(self._result_cache)
 
 
 class BaseAuthUserManager(BaseUserManager):
 
+    def get_queryset(self):
+        return BaseAuthUserQuerySet(self.model, using=self._db)
+
+    def with_remote_fields(self):
+        return self.get_queryset().with_remote_fields()
+
     def get(self, *args, **kwargs):
         try:
-            user = super().get(*args, **kwargs)
-            user_data = client.get_user_data(id=user.id)
+            # remote fields are hydrated lazily, on first access
+            return super().get(*args, **kwargs)
         except FieldError:
-            user_data = client.get_user_data(**kwargs)
+            user_data = AuthClient().get_user_data(**kwargs)
             user = super().get(id=user_data.get("id"))
-
-        if user and user_data:
-            user.update_fields(user_data)
-        return user
+            user.load_remote_fields(user_data)
+            return user
 
     def filter(self, *args, **kwargs):
+        """
+        Filters on local and remote fields. Remote lookups are answered by the
+        shadow table when it is enabled and fresh, as a subquery; otherwise every
+        id the auth server returns goes into a single ``id__in``, which is
+        unbounded and can exceed the database's query parameter limit. Use
+        iter_filter() for lookups that may match many users.
+        """
         try:
             queryset = super().filter(*args, **kwargs)
         except FieldError:
-            user_ids = client.filter_user(**kwargs).get("user_id", [])
+            # resolved in SQL against the shadow table when it is enabled and fresh
+            user_ids = shadow_user_ids(**kwargs)
+            if user_ids is None:
+                # unbounded, see the docstring
+                user_ids = list(AuthClient().filter_user(raw=True, **kwargs).user_id)
             queryset = super().filter(id__in=user_ids)
         return queryset
 
+    def iter_filter(self, *args, chunk_size=None, **kwargs):
+        """
+        Like filter(), but yields users chunk by chunk, so memory and the size of
+        each ``id__in`` stay bounded however many users match. Users matched on
+        remote fields come hydrated from the filter response.
+        """
+        chunk_size = chunk_size or get_filter_page_size()
+        try:
+            queryset = super().filter(*args, **kwargs)
+        except FieldError:
+            if (user_ids := shadow_user_ids(**kwargs)) is not None:
+                yield from super().filter(id__in=user_ids).iterator(chunk_size=chunk_size)
+                return
+            for users_data in AuthClient().iter_user_pages(page_size=chunk_size, **kwargs):
+                for user in super().filter(id__in=list(users_data)):
+                    user.load_remote_fields(users_data[user.id])
+                    yield user
+        else:
+            yield from queryset.iterator(chunk_size=chunk_size)
+
     def all_users(self):
         return self.filter()
 
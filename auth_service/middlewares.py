@@ -1,43 +1,52 @@
-# from django.utils.functional import SimpleLazyObject
-# from django.core.exceptions import MiddlewareNotUsed
-# from django.conf import settings
-# from .services.Authentication import AuthService
-#
-#
-# class AuthServiceMiddleware:
-#     """
-#     Middleware for authenticating users via the AuthService.
-#     Adds the authenticated user object to the request.
-#     """
-#
-#     def __init__(self, get_response):
-#         self.get_response = get_response
-#         self.auth_service_enabled = getattr(settings, "AUTH_SERVICE_ENABLED", True)
-#
-#         if not self.auth_service_enabled:
-#             raise MiddlewareNotUsed("AuthServiceMiddleware is disabled in settings.")
-#
-#     def __call__(self, request):
-#         request.user = self.get_authenticated_user(request)
-#         response = self.get_response(request)
-#         return response
-#
-#     def get_authenticated_user(self, request):
-#         """
-#         Fetch and authenticate the user using AuthService.
-#         """
-#         authorization_header = request.headers.get("Authorization")
-#         if not authorization_header or not authorization_header.startswith("Bearer "):
-#             return None
-#
-#         token = authorization_header.split("Bearer ")[1]
-#         authenticator = AuthService(token=token)
-#         try:
-#             print('authenticating')
-#             user, token = authenticator.authenticate()
-
-#             return user
-#         except Exception as e:
-#             # Handle token errors or auth service errors
-#             print(f"AuthService Error: {e}")
-#             return None
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+
+from .services.Authentication import AsyncAuthService, AuthService, get_bearer_token
+
+
+class AuthServiceMiddleware:
+    """
+    Middleware for authenticating users via the AuthService.
+    Adds the authenticated user object to the request.
+
+    Under ASGI the token is verified with AsyncAuthService, so async views never
+    block the event loop on gRPC. AuthServiceDrfAuthentication reuses the result.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.auth_service_enabled = getattr(settings, "AUTH_SERVICE_ENABLED", True)
+
+        if not self.auth_service_enabled:
+            raise MiddlewareNotUsed("AuthServiceMiddleware is disabled in settings.")
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if token := get_bearer_token(request.headers.get("Authorization")):
+            try:
+                self.set_user(request, AuthService(token=token).authenticate())
+            except AuthenticationFailed:
+                pass
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if token := get_bearer_token(request.headers.get("Authorization")):
+            try:
+                self.set_user(request, await AsyncAuthService(token=token).authenticate())
+            except AuthenticationFailed:
+                pass
+        return await self.get_response(request)
+
+    @staticmethod
+    def set_user(request, authenticated):
+        request.auth_service_auth = authenticated
+        request.user = authenticated[0]
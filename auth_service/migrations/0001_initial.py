@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemoteUserShadow',
+            fields=[
+                ('user_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('username', models.CharField(blank=True, db_index=True, max_length=150)),
+                ('email', models.CharField(blank=True, db_index=True, max_length=254)),
+                ('phone', models.CharField(blank=True, db_index=True, max_length=32)),
+                ('national_id', models.CharField(blank=True, db_index=True, max_length=10)),
+                ('is_active', models.BooleanField(db_index=True, default=False)),
+                ('synced_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'remote user shadow',
+            },
+        ),
+        migrations.CreateModel(
+            name='RemoteUserRole',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=150)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roles', to='auth_service.remoteusershadow')),
+            ],
+            options={
+                'unique_together': {('user', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RemoteUserDepartment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=150)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departments', to='auth_service.remoteusershadow')),
+            ],
+            options={
+                'unique_together': {('user', 'name')},
+            },
+        ),
+    ]
@@ -1,3 +1,6 @@
+import copy
+from types import MappingProxyType
+
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.db import models
 from django.contrib.auth.models import PermissionsMixin
@@ -5,7 +8,89 @@ from django.contrib.auth.models import PermissionsMixin
 from .managers import BaseAuthUserManager
 
 
-class BaseAuthUser(AbstractBaseUser, PermissionsMixin):
+class RemoteField:
+    """
+    Descriptor for a user attribute owned by the auth server.
+
+    The remote profile is fetched on first access of any remote attribute, so
+    instances that only touch local columns never trigger a gRPC call.
+    """
+
+    def __init__(self, default=None):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.name not in instance.__dict__:
+            instance.load_remote_fields()
+        return instance.__dict__[self.name]
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+
+class RolesMixin:
+    """
+    Role and department checks for users hydrated from the auth server.
+
+    The ``roles`` and ``departments`` lists are turned into frozensets once and
+    reused until they are reassigned, so each check is a set lookup. Department
+    access levels come from the catalog snapshot.
+    """
+    __slots__ = ()
+
+    def _permission_sets(self):
+        roles, departments = self.roles, self.departments
+        sets = getattr(self, '_role_sets', None)
+        if sets is None or sets[0] is not roles or sets[1] is not departments:
+            sets = (roles, departments, frozenset(roles or ()), frozenset(departments or ()))
+            object.__setattr__(self, '_role_sets', sets)
+        return sets
+
+    @property
+    def role_set(self) -> frozenset:
+        return self._permission_sets()[2]
+
+    @property
+    def department_set(self) -> frozenset:
+        return self._permission_sets()[3]
+
+    def has_role(self, role) -> bool:
+        return role in self.role_set
+
+    def has_any_role(self, *roles) -> bool:
+        return not self.role_set.isdisjoint(roles)
+
+    def in_department(self, department) -> bool:
+        return department in self.department_set
+
+    @property
+    def department_access_levels(self) -> dict:
+        from .catalog import catalog
+
+        snapshot = catalog.snapshot
+        department_set = self.department_set
+        levels = getattr(self, '_department_access_levels', None)
+        if levels is None or levels[0] is not snapshot or levels[1] is not department_set:
+            access_levels = {department: snapshot.access_level(department) for department in department_set}
+            levels = (snapshot, department_set, access_levels)
+            object.__setattr__(self, '_department_access_levels', levels)
+        return levels[2]
+
+    def max_access_level(self) -> int:
+        """
+        Highest access level among the user's departments and the access_level of the user payload.
+        """
+        # read the departments first: on a model instance that triggers the remote load setting access_level
+        department_levels = self.department_access_levels.values()
+        return max(int(getattr(self, 'access_level', 0) or 0), *department_levels, 0)
+
+
+class BaseAuthUser(RolesMixin, AbstractBaseUser, PermissionsMixin):
     remote_fields = {"phone": None,
                      "email": None,
                      "first_name": None,
@@ -20,31 +105,24 @@ class BaseAuthUser(AbstractBaseUser, PermissionsMixin):
                      "is_active": None
                      }
 
+    phone = RemoteField("")
+    email = RemoteField("")
+    first_name = RemoteField("")
+    last_name = RemoteField("")
+    service = RemoteField({})
+    sub_services = RemoteField([])
+    roles = RemoteField([])
+    departments = RemoteField([])
+    image = RemoteField("")
+    username = RemoteField("")
+    is_verified = RemoteField(True)
+    is_active = RemoteField(False)
+
     def exists_in_db(self):
         from django.contrib.auth import get_user_model
         CustomUser = get_user_model()
         return self.pk is not None and CustomUser.objects.filter(pk=self.pk).exists()
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        # initiating base user model fields for CustomUser instances
-        self.phone: str = ""
-        self.email: str = ""
-        self.first_name: str = ""
-        self.last_name: str = ""
-        self.service: dict[str:str] = {}
-        self.sub_services: list[str] = []
-        self.roles: list[str] = []
-        self.departments: list[str] = []
-        self.image: str = ""
-        self.username: str = ""
-        self.is_verified: bool = True
-        self.is_active: bool = False
-
-        if self.exists_in_db():
-            self.reload_meta()
-
     id = models.PositiveIntegerField(primary_key=True, unique=True)
     national_id = models.CharField(max_length=10, null=True, blank=True, unique=True)
     is_staff = models.BooleanField(default=False)
@@ -56,6 +134,29 @@ class BaseAuthUser(AbstractBaseUser, PermissionsMixin):
     class Meta:
         abstract = True
 
+    @classmethod
+    def get_remote_field_descriptors(cls):
+        return {name: attr for klass in reversed(cls.__mro__) for name, attr in vars(klass).items()
+                if isinstance(attr, RemoteField)}
+
+    def load_remote_fields(self, user_data=None):
+        """
+        Fetches the remote profile once per instance; later calls are no-ops.
+        Passing ``user_data`` hydrates the instance from an already fetched payload.
+        """
+        if self.__dict__.get('_remote_fields_loaded') and user_data is None:
+            return self
+        self.__dict__['_remote_fields_loaded'] = True
+
+        for name, field in self.get_remote_field_descriptors().items():
+            self.__dict__.setdefault(name, copy.copy(field.default))
+
+        if user_data is not None:
+            self.update_fields(user_data)
+        elif self.pk is not None:
+            self.reload_meta()
+        return self
+
     def reload_meta(self):
         from .grpc_client.client import AuthClient
         client = AuthClient()
@@ -67,38 +168,166 @@ class BaseAuthUser(AbstractBaseUser, PermissionsMixin):
         return self
 
     def update_fields(self, fetched_user):
+        """
+        Applies a remote payload to the instance.
 
-        if fetched_user:
-            for k, v in fetched_user.items():
-                match k:
-                    case "national_id":
-                        if not self.national_id or (self.national_id and self.national_id != v):
-                            setattr(self, k, v)
-                            self.save(update_fields=['national_id'])
-
-                    case "is_superuser":
-                        if not self.is_superuser or (self.is_superuser and self.is_superuser != v):
-                            setattr(self, k, v)
-                            self.save(update_fields=['is_superuser'])
-
-                    case "is_staff":
-                        if not self.is_staff or (self.is_staff and self.is_staff != v):
-                            setattr(self, k, v)
-                            self.save(update_fields=['is_staff'])
-                    case _:
-                        setattr(self, k, v)
-                        self.save()
-
-            return self
-        else:
+        Remote-only attributes are set in memory. Local columns are compared with
+        the payload and only the changed ones are written, in a single UPDATE.
+        """
+        if not fetched_user:
             return self
 
+        columns = {field.attname: field for field in self._meta.concrete_fields if not field.primary_key}
+        changed_fields = []
+
+        for k, v in fetched_user.items():
+            if k == self._meta.pk.attname:
+                continue
+
+            if field := columns.get(k):
+                if v == "" and field.null:
+                    v = None
+                if getattr(self, k) != v:
+                    setattr(self, k, v)
+                    changed_fields.append(k)
+            else:
+                setattr(self, k, v)
+
+        if changed_fields and not self._state.adding:
+            self.save(update_fields=changed_fields)
+        return self
+
+
+class RemoteUserShadow(models.Model):
+    """
+    Optional local copy of the searchable remote attributes (AUTH_SHADOW_TABLE),
+    so filters on remote fields resolve as indexed SQL instead of a FilterUser RPC.
+    Kept current by the user sync and update signals, see ``auth_service.shadow``.
+    """
+    user_id = models.PositiveIntegerField(primary_key=True)
+    username = models.CharField(max_length=150, blank=True, db_index=True)
+    email = models.CharField(max_length=254, blank=True, db_index=True)
+    phone = models.CharField(max_length=32, blank=True, db_index=True)
+    national_id = models.CharField(max_length=10, blank=True, db_index=True)
+    is_active = models.BooleanField(default=False, db_index=True)
+    synced_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "remote user shadow"
+
+
+class RemoteUserRole(models.Model):
+    user = models.ForeignKey(RemoteUserShadow, on_delete=models.CASCADE, related_name="roles")
+    name = models.CharField(max_length=150, db_index=True)
+
+    class Meta:
+        unique_together = ("user", "name")
+
+
+class RemoteUserDepartment(models.Model):
+    user = models.ForeignKey(RemoteUserShadow, on_delete=models.CASCADE, related_name="departments")
+    name = models.CharField(max_length=150, db_index=True)
+
+    class Meta:
+        unique_together = ("user", "name")
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class User(RolesMixin):
+    """
+    Immutable remote user, used instead of a model when USER_DB_MODEL is off.
+
+    Instances have no ``__dict__`` and only hold tuples, frozensets and read-only
+    mappings, so a single instance can be cached and shared between requests.
+    """
+    __slots__ = ("id", "national_id", "phone", "email", "first_name", "last_name", "service", "sub_services",
+                 "roles", "departments", "image", "username", "is_verified", "is_active", "is_staff",
+                 "is_superuser", "access_level", "role_set", "department_set", "_department_access_levels")
+
+    fields = ("national_id", "phone", "email", "first_name", "last_name", "service", "sub_services", "roles",
+              "departments", "image", "username", "is_verified", "is_active", "is_staff", "is_superuser",
+              "access_level")
+    defaults = {**BaseAuthUser.remote_fields, "national_id": None, "is_staff": False, "is_superuser": False,
+                "access_level": 0}
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, user_data=None):
+        user_data = user_data or {}
+        set_field = object.__setattr__
+        set_field(self, "id", int(id))
+        for field_name in self.fields:
+            set_field(self, field_name, _freeze(user_data.get(field_name, self.defaults[field_name])))
+        set_field(self, "roles", tuple(self.roles or ()))
+        set_field(self, "departments", tuple(self.departments or ()))
+        set_field(self, "role_set", frozenset(self.roles))
+        set_field(self, "department_set", frozenset(self.departments))
+        set_field(self, "_department_access_levels", None)
+
+    @classmethod
+    def from_proto(cls, message):
+        """
+        Builds a user straight from a ``UserData`` message, without going through MessageToDict.
+        """
+        service = message.service
+        return cls(message.id, {
+            "national_id": message.national_id,
+            "phone": message.phone,
+            "email": message.email,
+            "first_name": message.first_name,
+            "last_name": message.last_name,
+            "service": {"name": service.name, "domain": service.domain},
+            "sub_services": [{"id": sub_service.id, "name": sub_service.name, "pname": sub_service.pname,
+                              "domain": sub_service.domain, "description": sub_service.description,
+                              "access_type": sub_service.access_type, "access_id": sub_service.access_id}
+                             for sub_service in message.sub_services],
+            "roles": message.roles,
+            "departments": message.departments,
+            "image": message.image,
+            "username": message.username,
+            "is_active": message.is_active,
+            "is_staff": message.is_staff,
+            "is_superuser": message.is_superuser,
+            "access_level": message.access_level,
+        })
+
+    @property
+    def pk(self):
+        return self.id
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, **{field_name: _thaw(getattr(self, field_name)) for field_name in self.fields}}
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return self.__class__, (self.id, self.to_dict())
+
+    def __eq__(self, other):
+        return isinstance(other, User) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
 
-class User:
-    def __init__(self, id, user_data):
-        self.id = id
-        self.is_authenticated = True
-        remote_fields = BaseAuthUser.remote_fields
-        remote_fields.update({'national_id': None})
-        for field_name, default_value in BaseAuthUser.remote_fields.items():
-            setattr(self, field_name, user_data.get(field_name, default_value))
+    def __repr__(self):
+        return f"<User: {self.id}>"
@@ -0,0 +1,40 @@
+from rest_framework.permissions import BasePermission
+
+
+class HasRole(BasePermission):
+    """
+    Allows access to users having at least one of the given roles.
+
+        permission_classes = [HasRole("admin", "staff")]
+    """
+
+    def __init__(self, *roles):
+        self.roles = frozenset(roles)
+
+    def __call__(self):
+        # DRF instantiates every entry of permission_classes
+        return self
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and hasattr(user, "has_any_role")
+                    and user.has_any_role(*self.roles))
+
+
+class MinAccessLevel(BasePermission):
+    """
+    Allows access to users whose highest department access level is at least ``level``.
+
+        permission_classes = [MinAccessLevel(3)]
+    """
+
+    def __init__(self, level):
+        self.level = level
+
+    def __call__(self):
+        return self
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and hasattr(user, "max_access_level")
+                    and user.max_access_level() >= self.level)
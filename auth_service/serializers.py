@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from auth_service.grpc_client.client import AuthClient
+from auth_service.managers import prefetch_remote_fields
+from auth_service.sync import CHANGE_TYPES
 
 CustomUser = get_user_model()
-client = AuthClient()
 
 
 class BaseSerializer(serializers.ModelSerializer):
@@ -31,10 +32,22 @@ class BaseSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class UserListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        # one FilterUserSerialized call per page instead of one GetUserData per row
+        if hasattr(data, 'with_remote_fields'):
+            data = data.with_remote_fields()
+        elif isinstance(data, list):
+            prefetch_remote_fields(data)
+        return super().to_representation(data)
+
+
 class UserSerializer(BaseSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'national_id', 'contacts']
+        list_serializer_class = UserListSerializer
 
     def get_fields(self):
         fields = super().get_fields()
@@ -49,6 +62,15 @@ class UserSerializer(BaseSerializer):
         return fields
 
 
+class UserChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    type = serializers.ChoiceField(choices=CHANGE_TYPES)
+
+
+class UpdateSignalSerializer(serializers.Serializer):
+    changes = UserChangeSerializer(many=True, required=False)
+
+
 # DEPRECATED
 class SignalSerializer(serializers.Serializer):
     id = serializers.IntegerField(required=True)
@@ -63,7 +85,7 @@ class SignalSerializer(serializers.Serializer):
     def create(self, validated_data):
         try:
             user_id = validated_data.get('id')
-            user_data = client.get_user_data(id=user_id)
+            user_data = AuthClient().get_user_data(id=user_id)
             user = CustomUser.objects.create(id=user_id)
             return user
         except Exception as err:
@@ -1,7 +1,134 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.functional import SimpleLazyObject
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from ..cache import LRUCache, token_cache, user_cache, user_row_cache
+from ..exceptions import GRPC_Exception
+from ..grpc_client.aio_client import AsyncAuthClient
 from ..grpc_client.client import AuthClient
 from ..utils import is_user_db_model
+from .LocalVerification import local_verification_enabled, verify_locally
+
+REJECTED_STATUSES = ("UNAUTHENTICATED", "PERMISSION_DENIED", "NOT_FOUND", "INVALID_ARGUMENT")
+UNAVAILABLE_STATUSES = ("UNAVAILABLE", "DEADLINE_EXCEEDED")
+
+
+def cache_verify_result(token, result):
+    if result.get('success') and int(result.get('user_id') or 0):
+        return token_cache.set_verified(token, result['user_id'])
+    return token_cache.set_rejected(token, detail="Invalid token", status_detail="UNAUTHENTICATED")
+
+
+def cache_verify_error(token, err):
+    """
+    Caches definite rejections. While the auth server is unreachable (or the circuit
+    breaker is open) returns a recently verified entry if degraded mode allows it.
+    """
+    if err.status_detail in REJECTED_STATUSES:
+        token_cache.set_rejected(token, detail=err.detail, status_detail=err.status_detail)
+    elif err.status_detail in UNAVAILABLE_STATUSES:
+        return token_cache.get_stale(token)
+
+
+def user_id_from_entry(entry) -> int:
+    if not entry['success']:
+        raise GRPC_Exception(detail=entry['detail'], status_detail=entry['status_detail'])
+    return entry['user_id']
+
+
+# immutable User objects, shared between requests while their cached payload is unchanged
+remote_users = LRUCache(max_size=1024)
+
+
+def get_remote_user(user_id, user_data):
+    from ..models import User
+
+    cached = remote_users.get(user_id)
+    if cached is not None and cached[0] is user_data:
+        return cached[1]
+    user = User(id=user_id, user_data=user_data)
+    remote_users.set(user_id, (user_data, user), user_cache.store.local_ttl)
+    return user
+
+
+def get_user_row(User, user_id, user_data=None, remember=False):
+    """
+    Loads the local row of an authenticated user with one plain SELECT. The
+    manager's get() is bypassed on purpose: it would resolve remote lookups.
+
+    On first sight the row is created with its local columns (national_id,
+    is_staff, is_superuser...) filled from ``user_data`` or one GetUserData call.
+    Existing rows are recorded in user_row_cache only when ``remember`` is set.
+    """
+    queryset = User._default_manager.get_queryset()
+    try:
+        user = queryset.get(id=user_id)
+    except User.DoesNotExist:
+        user = User(id=user_id)
+        try:
+            user.load_remote_fields(user_data or AuthClient().get_user_data(id=user_id))
+        except GRPC_Exception:
+            # the columns are filled in by the next sync or the first remote field access
+            pass
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+        except IntegrityError:
+            # created concurrently by another request
+            user = queryset.get(id=user_id)
+        remember = True
+    if remember:
+        user_row_cache.set(user_id, True)
+    return user
+
+
+class LazyUser(SimpleLazyObject):
+    """
+    Stands in for a user row known to exist (AUTH_LAZY_USER). ``id``, ``pk`` and
+    ``is_authenticated`` are answered without a query; the row is loaded when
+    any other attribute is read.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, loader):
+        self.__dict__["_user_id"] = user_id
+        super().__init__(loader)
+
+    @property
+    def id(self):
+        return self.__dict__["_user_id"]
+
+    @property
+    def pk(self):
+        return self.__dict__["_user_id"]
+
+
+def user_id_hint(token):
+    """
+    The user id a JWT claims, read without verifying its signature. Only used to
+    start fetching the profile while the token is being verified, so malformed
+    or expired tokens and non-positive ids give None.
+    """
+    if not getattr(settings, "AUTH_PREFETCH_USER_DATA", True):
+        return None
+    try:
+        import jwt
+        claims = jwt.decode(token, options={"verify_signature": False, "verify_exp": True})
+        user_id = int(claims[getattr(settings, "AUTH_JWT_USER_ID_CLAIM", "user_id")])
+    except Exception:
+        return None
+    return user_id if user_id > 0 else None
+
+
+def get_bearer_token(authorization_header):
+    if not authorization_header or not authorization_header.startswith("Bearer "):
+        return None
+    return authorization_header.split("Bearer ")[1]
 
 
 class AuthService:
@@ -9,28 +136,76 @@ class AuthService:
         self.client = AuthClient()
         self.token = token
 
+    def lookup_token(self):
+        """
+        The token cache entry, or the result of local JWT verification. None when
+        only the auth server can tell.
+        """
+        entry = token_cache.get(self.token)
+        if entry is None:
+            entry = verify_locally(self.token)
+        return entry
+
+    def verify_token(self) -> int:
+        """
+        Resolves the token to a user id, consulting the token cache and local JWT
+        verification before the auth server.
+        """
+        return self._verify_entry(self.lookup_token())
+
+    def _verify_entry(self, entry) -> int:
+        if entry is None:
+            try:
+                result = self.client.verify_login(self.token)
+            except GRPC_Exception as err:
+                if not (entry := cache_verify_error(self.token, err)):
+                    raise
+            else:
+                entry = cache_verify_result(self.token, result)
+
+        return user_id_from_entry(entry)
+
     def _user_model_authenticate(self):
         from django.contrib.auth import get_user_model
         User = get_user_model()
 
         try:
-            result = self.client.verify_login(self.token)
-            user_id = result.get('user_id')
-            user, created = User.objects.get_or_create(id=int(user_id))
+            user_id = int(self.verify_token())
+            lazy = getattr(settings, "AUTH_LAZY_USER", False)
+            if lazy and user_row_cache.get(user_id):
+                user = LazyUser(user_id, lambda: get_user_row(User, user_id))
+            else:
+                # the row cache is only read by AUTH_LAZY_USER
+                user = get_user_row(User, user_id, remember=lazy)
+            if getattr(settings, "AUTH_HYDRATE_ON_AUTH", False):
+                user.load_remote_fields()
             return user, self.token,
         except Exception as err:
             err.__dict__.update({'msg': "Authentication failed"})
             raise AuthenticationFailed(err.__dict__)
 
-    def _non_user_model_authenticate(self):
-        from ..models import User
+    def _prefetch_user_data(self):
+        """
+        For a token that has to go to VerifyLogin, starts fetching the profile it
+        claims to belong to concurrently. Rejected tokens are in the token cache,
+        so a forged token costs at most one speculative call.
+        Returns (user_id, wait) or None.
+        """
+        if (user_id := user_id_hint(self.token)) is None or user_cache.get(user_id) is not None:
+            return None
+        return user_id, self.client.prefetch_user_data(user_id)
 
+    def _non_user_model_authenticate(self):
         try:
-            result = self.client.verify_login(self.token)
-            user_id = result.get('user_id')
-            user_data = self.client.get_user_data(id=int(user_id))
+            entry = self.lookup_token()
+            prefetch = self._prefetch_user_data() if entry is None else None
+            user_id = int(self._verify_entry(entry))
+            # the speculative profile is only used if the token turned out to belong to that user
+            user_data = prefetch[1]() if prefetch is not None and prefetch[0] == user_id else None
+            if user_data is None:
+                user_data = self.client.get_user_data(id=user_id)
 
-            user = User(id=int(user_id), user_data=user_data)
+            user = get_remote_user(int(user_id), user_data)
 
             return user, self.token,
         except Exception as err:
@@ -43,15 +218,101 @@ class AuthService:
             return self._non_user_model_authenticate()
 
 
+class AsyncAuthService:
+    """
+    asyncio version of AuthService for ASGI code paths; RPCs go through AsyncAuthClient.
+    """
+
+    def __init__(self, token):
+        self.client = AsyncAuthClient()
+        self.token = token
+
+    async def lookup_token(self):
+        entry = await token_cache.aget(self.token)
+        if entry is None and local_verification_enabled():
+            entry = await sync_to_async(verify_locally)(self.token)
+        return entry
+
+    async def verify_token(self) -> int:
+        return await self._verify_entry(await self.lookup_token())
+
+    async def _verify_entry(self, entry) -> int:
+        if entry is None:
+            try:
+                result = await self.client.verify_login(self.token)
+            except GRPC_Exception as err:
+                if not (entry := await sync_to_async(cache_verify_error)(self.token, err)):
+                    raise
+            else:
+                entry = await sync_to_async(cache_verify_result)(self.token, result)
+
+        return user_id_from_entry(entry)
+
+    async def _user_model_authenticate(self):
+        from django.contrib.auth import get_user_model
+        User = get_user_model()
+
+        try:
+            user_id = int(await self.verify_token())
+            # no LazyUser here: loading it on first touch would run sync queries inside async views
+            user = await sync_to_async(get_user_row)(User, user_id)
+            if getattr(settings, "AUTH_HYDRATE_ON_AUTH", False):
+                await sync_to_async(user.load_remote_fields)()
+            return user, self.token,
+        except Exception as err:
+            err.__dict__.update({'msg': "Authentication failed"})
+            raise AuthenticationFailed(err.__dict__)
+
+    async def _prefetch_user_data(self):
+        if (user_id := user_id_hint(self.token)) is None or await user_cache.aget(user_id) is not None:
+            return None
+        task = asyncio.ensure_future(self.client.get_user_data(id=user_id))
+        # an unused prefetch may fail; its error must not be reported as never retrieved
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return user_id, task
+
+    async def _non_user_model_authenticate(self):
+        prefetch = None
+        try:
+            entry = await self.lookup_token()
+            prefetch = await self._prefetch_user_data() if entry is None else None
+            user_id = int(await self._verify_entry(entry))
+            user_data = None
+            if prefetch is not None and prefetch[0] == user_id:
+                try:
+                    user_data = await prefetch[1]
+                except GRPC_Exception:
+                    pass
+            if user_data is None:
+                user_data = await self.client.get_user_data(id=user_id)
+
+            user = get_remote_user(int(user_id), user_data)
+
+            return user, self.token,
+        except Exception as err:
+            raise AuthenticationFailed(f"Authentication failed: {str(err)}")
+        finally:
+            if prefetch is not None and not prefetch[1].done():
+                prefetch[1].cancel()
+
+    async def authenticate(self):
+        if is_user_db_model():
+            return await self._user_model_authenticate()
+        else:
+            return await self._non_user_model_authenticate()
+
+
 class AuthServiceDrfAuthentication(BaseAuthentication):
 
     def authenticate(self, request):
-        authorization_header = request.headers.get("Authorization")
+        # already authenticated by AuthServiceMiddleware, e.g. on the async path
+        if authenticated := getattr(request._request, 'auth_service_auth', None):
+            return authenticated
 
-        if not authorization_header or not authorization_header.startswith("Bearer "):
-            return None  # No authentication header, continue to next authentication class
+        token = get_bearer_token(request.headers.get("Authorization"))
 
-        token = authorization_header.split("Bearer ")[1]
+        if not token:
+            return None  # No authentication header, continue to next authentication class
 
         authenticator = AuthService(token=token)
         print('authenticating')
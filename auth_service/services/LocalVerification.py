@@ -0,0 +1,220 @@
+import json
+import os
+import time
+from threading import Event, Lock
+
+from django.conf import settings
+
+from ..cache import token_cache
+
+
+def local_verification_enabled():
+    return getattr(settings, "AUTH_LOCAL_JWT_VERIFICATION", False)
+
+
+def token_lifetime(token):
+    """
+    Seconds left until the token's ``exp`` claim, read without verifying the
+    signature. Falls back to AUTH_JWT_REVOCATION_TTL for tokens without one.
+    """
+    import jwt
+
+    default = getattr(settings, "AUTH_JWT_REVOCATION_TTL", 86400)
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return default
+    return max(0, exp - time.time()) if isinstance(exp, (int, float)) else default
+
+
+def parse_keys(content):
+    """
+    Parses a JWKS document, a single JWK or a PEM public key into ``{kid: key}``.
+    A PEM key has no key id and is stored under None.
+    """
+    import jwt
+
+    content = content.strip()
+    if not content.startswith("{"):
+        return {None: content}
+    document = json.loads(content)
+    if "keys" not in document:
+        document = {"keys": [document]}
+    return {key.key_id: key for key in jwt.PyJWKSet.from_dict(document).keys}
+
+
+class KeySet:
+    """
+    Public keys used to verify tokens locally, by key id.
+
+    Keys come from AUTH_JWT_PUBLIC_KEYS_FILE (reloaded when the file changes)
+    and/or AUTH_JWT_JWKS_URL (cached for AUTH_JWT_JWKS_CACHE_TTL seconds). An
+    unknown key id triggers a refetch of the URL, at most once every
+    AUTH_JWT_JWKS_MIN_REFRESH seconds, so rotated keys are picked up.
+
+    Only one thread fetches the URL at a time, without holding the lock; the
+    others keep using the current keys, and wait for the fetch only when they
+    have no key to use.
+    """
+
+    def __init__(self):
+        self._file_keys = {}
+        self._file_mtime = None
+        self._url_keys = {}
+        self._fetched_at = None
+        self._fetching = None
+        self._lock = Lock()
+
+    def get(self, kid):
+        with self._lock:
+            self._load_file()
+        url = getattr(settings, "AUTH_JWT_JWKS_URL", None)
+        if url:
+            self._refresh(url, getattr(settings, "AUTH_JWT_JWKS_CACHE_TTL", 300), wait=self._fetched_at is None)
+
+        key = self._lookup(kid)
+        if key is None and url:
+            self._refresh(url, getattr(settings, "AUTH_JWT_JWKS_MIN_REFRESH", 30), wait=True)
+            key = self._lookup(kid)
+        return key
+
+    def _refresh(self, url, max_age, wait):
+        """
+        Fetches the URL if the keys are older than ``max_age`` and no other thread
+        is fetching it already; with ``wait``, also waits for a fetch in progress.
+        """
+        with self._lock:
+            fetching, owner = self._fetching, self._fetching is None
+            if owner:
+                if self._fetched_at is not None and self._age() < max_age:
+                    return
+                fetching = self._fetching = Event()
+                self._fetched_at = time.monotonic()
+
+        if owner:
+            try:
+                self._fetch(url)
+            finally:
+                with self._lock:
+                    self._fetching = None
+                fetching.set()
+        elif wait:
+            fetching.wait(getattr(settings, "AUTH_JWT_JWKS_TIMEOUT", 2.0))
+
+    def _age(self):
+        return time.monotonic() - self._fetched_at
+
+    def _lookup(self, kid):
+        keys = {**self._file_keys, **self._url_keys}
+        if kid is None and len(keys) == 1:
+            return next(iter(keys.values()))
+        return keys.get(kid)
+
+    def _load_file(self):
+        import jwt
+
+        path = getattr(settings, "AUTH_JWT_PUBLIC_KEYS_FILE", None)
+        if not path:
+            return
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if mtime != self._file_mtime:
+                with open(path) as key_file:
+                    self._file_keys = parse_keys(key_file.read())
+                self._file_mtime = mtime
+        except (OSError, ValueError, jwt.PyJWTError):
+            # keep the last good keys; unverifiable tokens go to the auth server
+            pass
+
+    def _fetch(self, url):
+        import jwt
+        import requests
+
+        try:
+            response = requests.get(url, timeout=getattr(settings, "AUTH_JWT_JWKS_TIMEOUT", 2.0))
+            response.raise_for_status()
+            self._url_keys = parse_keys(response.text)
+        except (requests.RequestException, ValueError, jwt.PyJWTError):
+            pass
+
+
+class LocalVerifier:
+    """
+    Verifies signed JWTs without calling the auth server (AUTH_LOCAL_JWT_VERIFICATION).
+
+    Checks the signature, expiry, audience (AUTH_JWT_AUDIENCE, by default
+    SERVICE_NAME and SUB_SERVICE_NAME), the optional issuer (AUTH_JWT_ISSUER) and
+    the revocation lists of the token cache. Opaque tokens and tokens signed with
+    an unknown key are left to the VerifyLogin RPC.
+    """
+
+    def __init__(self):
+        self.keys = KeySet()
+
+    @property
+    def algorithms(self):
+        return getattr(settings, "AUTH_JWT_ALGORITHMS", ["RS256", "ES256"])
+
+    @property
+    def audience(self):
+        default = [getattr(settings, "SERVICE_NAME", None), getattr(settings, "SUB_SERVICE_NAME", None)]
+        return [audience for audience in getattr(settings, "AUTH_JWT_AUDIENCE", default) if audience]
+
+    @property
+    def user_id_claim(self):
+        return getattr(settings, "AUTH_JWT_USER_ID_CLAIM", "user_id")
+
+    def verify(self, token):
+        """
+        Returns a token cache entry, or None when the token has to be verified by the auth server.
+        """
+        import jwt
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError:
+            return None
+
+        key = self.keys.get(header.get("kid"))
+        if key is None:
+            return None
+
+        algorithm = header.get("alg")
+        if algorithm not in self.algorithms or (isinstance(key, jwt.PyJWK) and key.algorithm_name != algorithm):
+            return self.reject(token, "Token signed with an unexpected algorithm")
+        if token_cache.is_token_revoked(token):
+            return self.reject(token, "Token has been revoked")
+
+        audience = self.audience
+        try:
+            claims = jwt.decode(token, key.key if isinstance(key, jwt.PyJWK) else key, algorithms=[algorithm],
+                                audience=audience or None, issuer=getattr(settings, "AUTH_JWT_ISSUER", None),
+                                leeway=getattr(settings, "AUTH_JWT_LEEWAY", 0),
+                                options={"require": ["exp", self.user_id_claim], "verify_aud": bool(audience)})
+            user_id = int(claims[self.user_id_claim])
+        except jwt.InvalidAlgorithmError:
+            # the algorithm passed the allow-list but is not available here (e.g. no cryptography)
+            return None
+        except (jwt.InvalidTokenError, TypeError, ValueError) as err:
+            return self.reject(token, str(err))
+        except jwt.PyJWTError:
+            # the key cannot be used here; the auth server decides
+            return None
+
+        verified_at = claims.get("iat") or time.time()
+        if user_id <= 0 or token_cache.is_revoked({"success": True, "user_id": user_id, "verified_at": verified_at}):
+            return self.reject(token, "Token has been revoked")
+        return token_cache.set_verified(token, user_id, timeout=claims["exp"] - time.time(), verified_at=verified_at)
+
+    @staticmethod
+    def reject(token, detail):
+        return token_cache.set_rejected(token, detail=detail, status_detail="UNAUTHENTICATED")
+
+
+local_verifier = LocalVerifier()
+
+
+def verify_locally(token):
+    if not local_verification_enabled():
+        return None
+    return local_verifier.verify(token)
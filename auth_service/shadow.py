@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .grpc_client.client import get_filter_page_size, iter_user_data_pages
+
+SHADOW_COLUMNS = ("username", "email", "phone", "national_id", "is_active")
+
+# UserQuery filters the shadow table can answer, with the same lookup names
+SHADOW_LOOKUPS = frozenset({
+    "id", "username", "email", "phone", "national_id", "is_active",
+    "roles__name", "roles__name__in", "departments__name", "departments__name__in",
+})
+
+
+def shadow_enabled():
+    return getattr(settings, "AUTH_SHADOW_TABLE", False)
+
+
+def get_shadow_max_age():
+    # seconds since a row was last synced before the shadow is considered stale
+    return getattr(settings, "AUTH_SHADOW_MAX_AGE", 3600)
+
+
+def is_shadow_fresh():
+    from .models import RemoteUserShadow
+
+    oldest = RemoteUserShadow.objects.order_by("synced_at").values_list("synced_at", flat=True).first()
+    return oldest is not None and timezone.now() - oldest <= timedelta(seconds=get_shadow_max_age())
+
+
+def shadow_user_ids(**filters):
+    """
+    Returns a subquery of the ids of the users matching ``filters``, or None when
+    the shadow is disabled, stale, or cannot answer one of the lookups.
+    """
+    from .models import RemoteUserShadow
+
+    if not shadow_enabled() or not set(filters) <= SHADOW_LOOKUPS or not is_shadow_fresh():
+        return None
+    lookups = {("user_id" if lookup == "id" else lookup): value for lookup, value in filters.items()}
+    return RemoteUserShadow.objects.filter(**lookups).values("user_id")
+
+
+def update_shadow(users_data, synced_at=None):
+    """
+    Upserts shadow rows, with their roles and departments, from ``{id: user_data}`` payloads.
+    """
+    from .models import RemoteUserDepartment, RemoteUserRole, RemoteUserShadow
+
+    if not users_data:
+        return 0
+    synced_at = synced_at or timezone.now()
+    rows = [RemoteUserShadow(user_id=int(user_id), username=user_data.get("username") or "",
+                             email=user_data.get("email") or "", phone=user_data.get("phone") or "",
+                             national_id=user_data.get("national_id") or "",
+                             is_active=bool(user_data.get("is_active")), synced_at=synced_at)
+            for user_id, user_data in users_data.items()]
+    user_ids = [row.user_id for row in rows]
+
+    with transaction.atomic():
+        RemoteUserShadow.objects.bulk_create(rows, update_conflicts=True, unique_fields=["user_id"],
+                                             update_fields=[*SHADOW_COLUMNS, "synced_at"])
+        RemoteUserRole.objects.filter(user_id__in=user_ids).delete()
+        RemoteUserDepartment.objects.filter(user_id__in=user_ids).delete()
+        RemoteUserRole.objects.bulk_create([RemoteUserRole(user_id=int(user_id), name=name)
+                                            for user_id, user_data in users_data.items()
+                                            for name in set(user_data.get("roles") or ())])
+        RemoteUserDepartment.objects.bulk_create([RemoteUserDepartment(user_id=int(user_id), name=name)
+                                                  for user_id, user_data in users_data.items()
+                                                  for name in set(user_data.get("departments") or ())])
+    return len(rows)
+
+
+def deactivate_shadow(user_ids):
+    from .models import RemoteUserShadow
+
+    return RemoteUserShadow.objects.filter(user_id__in=user_ids).update(is_active=False, synced_at=timezone.now())
+
+
+def delete_shadow(user_ids):
+    from .models import RemoteUserShadow
+
+    return RemoteUserShadow.objects.filter(user_id__in=user_ids).delete()[1].get(RemoteUserShadow._meta.label, 0)
+
+
+def refresh_shadow(page_size=None, users=None):
+    """
+    Rebuilds the shadow table from the auth server, page by page, and drops rows
+    of users the server no longer returns. ``users`` are the UserData messages of
+    a FilterUserSerialized listing the caller already fetched.
+    """
+    from .grpc_client.client import AuthClient
+    from .models import RemoteUserShadow
+
+    started = timezone.now()
+    result = {"synced": 0, "deleted": 0}
+    page_size = page_size or get_filter_page_size()
+    if users is None:
+        pages = AuthClient().iter_user_pages(page_size=page_size)
+    else:
+        pages = iter_user_data_pages(users, page_size)
+    for page in pages:
+        result["synced"] += update_shadow(page, synced_at=started)
+    deleted = RemoteUserShadow.objects.filter(synced_at__lt=started).delete()[1]
+    result["deleted"] = deleted.get(RemoteUserShadow._meta.label, 0)
+    return result
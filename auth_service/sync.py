@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from .cache import token_cache, user_cache, user_row_cache
+from .grpc_client.converters import user_data_to_dict
+from .shadow import deactivate_shadow, delete_shadow, refresh_shadow, shadow_enabled, update_shadow
+
+CHANGE_CREATED = 'created'
+CHANGE_UPDATED = 'updated'
+CHANGE_DEACTIVATED = 'deactivated'
+CHANGE_DELETED = 'deleted'
+CHANGE_TYPES = (CHANGE_CREATED, CHANGE_UPDATED, CHANGE_DEACTIVATED, CHANGE_DELETED)
+
+
+def get_sync_batch_size():
+    return getattr(settings, 'AUTH_SYNC_BATCH_SIZE', 500)
+
+
+def iter_local_user_ids(User, batch_size):
+    """
+    Streams local user ids in ascending order using keyset pagination,
+    so no server-side cursor stays open while rows are written.
+    """
+    last_id = None
+    while True:
+        queryset = User.objects.order_by('id').values_list('id', flat=True)
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        user_ids = list(queryset[:batch_size])
+        yield from user_ids
+        if len(user_ids) < batch_size:
+            return
+        last_id = user_ids[-1]
+
+
+def diff_sorted_ids(remote_ids, local_ids):
+    """
+    Merge-joins two ascending id streams and yields ``(user_id, is_remote)``
+    for every id that is present on one side only.
+    """
+    remote_ids, local_ids = iter(remote_ids), iter(local_ids)
+    remote_id, local_id = next(remote_ids, None), next(local_ids, None)
+
+    while remote_id is not None or local_id is not None:
+        if local_id is None or (remote_id is not None and remote_id < local_id):
+            yield remote_id, True
+            remote_id = next(remote_ids, None)
+        elif remote_id is None or local_id < remote_id:
+            yield local_id, False
+            local_id = next(local_ids, None)
+        else:
+            remote_id, local_id = next(remote_ids, None), next(local_ids, None)
+
+
+class UserSync:
+    """
+    Reconciles the local user table with the user ids known to the auth server.
+
+    The diff runs on the FilterUser id listing. Missing users are inserted with
+    bulk_create, their local columns filled from one get_users_data batch per
+    chunk, and stale users are deleted, both in chunks of ``batch_size`` with
+    one transaction per chunk. ``listing`` is a FilterUserSerialized response
+    the caller already fetched; it then replaces both RPCs.
+    """
+
+    def __init__(self, batch_size=None, dry_run=False, progress=None, listing=None):
+        self.batch_size = batch_size or get_sync_batch_size()
+        self.dry_run = dry_run
+        self.progress = progress
+        self.listing = listing
+        self.User = get_user_model()
+        self.result = {'remote': 0, 'created': 0, 'deleted': 0}
+        self._listed_users = {}
+
+    def fetch_remote_ids(self):
+        if self.listing is not None:
+            self._listed_users = {user.id: user for user in self.listing.users}
+            return sorted(self._listed_users)
+
+        from auth_service.grpc_client.client import AuthClient
+        client = AuthClient()
+        return sorted(set(map(int, client.filter_user(raw=True).user_id)))
+
+    def fetch_users_data(self, user_ids):
+        if self.listing is None:
+            from auth_service.grpc_client.client import AuthClient
+            return AuthClient().get_users_data(user_ids)
+
+        users_data = {user_id: user_data_to_dict(self._listed_users[user_id]) for user_id in user_ids}
+        user_cache.set_many(users_data)
+        return users_data
+
+    def run(self):
+        remote_ids = self.fetch_remote_ids()
+        self.result['remote'] = len(remote_ids)
+
+        to_create, to_delete = [], []
+        local_ids = iter_local_user_ids(self.User, self.batch_size)
+        for user_id, is_remote in diff_sorted_ids(remote_ids, local_ids):
+            if is_remote:
+                to_create.append(user_id)
+                if len(to_create) >= self.batch_size:
+                    self.create_chunk(to_create)
+                    to_create = []
+            else:
+                to_delete.append(user_id)
+                if len(to_delete) >= self.batch_size:
+                    self.delete_chunk(to_delete)
+                    to_delete = []
+
+        if to_create:
+            self.create_chunk(to_create)
+        if to_delete:
+            self.delete_chunk(to_delete)
+        return self.result
+
+    def create_chunk(self, user_ids):
+        if not self.dry_run:
+            users_data = self.fetch_users_data(user_ids)
+            # users missing from the batch get their local columns on the next sync or first remote access
+            users = [self.User(id=user_id).load_remote_fields(users_data[user_id]) if user_id in users_data
+                     else self.User(id=user_id) for user_id in user_ids]
+            with transaction.atomic():
+                self.User.objects.bulk_create(users, batch_size=self.batch_size, ignore_conflicts=True)
+        self.result['created'] += len(user_ids)
+        self.report('created', user_ids)
+
+    def delete_chunk(self, user_ids):
+        if not self.dry_run:
+            with transaction.atomic(), connection.constraint_checks_disabled():
+                self.User.objects.filter(id__in=user_ids).delete()
+            user_row_cache.delete_many(user_ids)
+        self.result['deleted'] += len(user_ids)
+        self.report('deleted', user_ids)
+
+    def report(self, action, user_ids):
+        if self.progress:
+            self.progress(action, len(user_ids), self.result)
+
+
+def sync_users(batch_size=None, dry_run=False, progress=None):
+    listing = None
+    if shadow_enabled() and not dry_run:
+        from auth_service.grpc_client.client import AuthClient
+        # the shadow refresh needs every profile anyway: one listing serves the diff and the shadow
+        listing = AuthClient().filter_user(serialized=True, raw=True)
+
+    result = UserSync(batch_size=batch_size, dry_run=dry_run, progress=progress, listing=listing).run()
+    if listing is not None:
+        result['shadow'] = refresh_shadow(batch_size, users=listing.users)
+    return result
+
+
+def evict_user(user_id, revoke_tokens=False):
+    """
+    Drops every cached copy of a user's remote data, optionally along with the user's verified tokens.
+    """
+    user_cache.delete(user_id)
+    if revoke_tokens:
+        token_cache.revoke_user(user_id)
+
+
+def apply_user_changes(changes):
+    """
+    Applies a targeted update signal: only the listed users are evicted from the caches
+    and, when USER_DB_MODEL is enabled, created, refreshed or deleted in the local table.
+
+    ``changes`` is an iterable of ``{"id": <user id>, "type": <one of CHANGE_TYPES>}``.
+    """
+    result = {change_type: 0 for change_type in CHANGE_TYPES}
+    by_type = {change_type: set() for change_type in CHANGE_TYPES}
+    for change in changes:
+        by_type[change['type']].add(int(change['id']))
+
+    for change_type, user_ids in by_type.items():
+        for user_id in user_ids:
+            evict_user(user_id, revoke_tokens=change_type in (CHANGE_DEACTIVATED, CHANGE_DELETED))
+        result[change_type] = len(user_ids)
+
+    if not getattr(settings, 'USER_DB_MODEL', False):
+        return result
+
+    if shadow_enabled():
+        deactivate_shadow(by_type[CHANGE_DEACTIVATED])
+        delete_shadow(by_type[CHANGE_DELETED])
+
+    from auth_service.grpc_client.client import AuthClient
+    client = AuthClient()
+    User = get_user_model()
+
+    if created := by_type[CHANGE_CREATED]:
+        User.objects.bulk_create([User(id=user_id) for user_id in created], ignore_conflicts=True)
+
+    # local columns (national_id, is_staff, is_superuser...) must not wait for a lazy reload
+    refreshed = created | by_type[CHANGE_UPDATED]
+    users_data = client.get_users_data(refreshed) if refreshed else {}
+    if shadow_enabled():
+        update_shadow(users_data)
+    for user in User.objects.filter(id__in=users_data):
+        user.load_remote_fields(users_data[user.id])
+
+    if deleted := by_type[CHANGE_DELETED]:
+        with transaction.atomic(), connection.constraint_checks_disabled():
+            User.objects.filter(id__in=deleted).delete()
+        user_row_cache.delete_many(deleted)
+    return result
@@ -0,0 +1,103 @@
+import time
+from threading import Lock, Thread
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .sync import sync_users
+
+
+class SyncScheduler:
+    """
+    Runs user syncs on a single background thread, without an external broker.
+
+    Signals are debounced for ``AUTH_SYNC_DEBOUNCE_SECONDS`` and any signals
+    received while a sync is pending or running are coalesced into a single
+    follow-up run.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._thread = None
+        self._pending = False
+        self._status = {
+            "state": "idle",
+            "runs": 0,
+            "coalesced": 0,
+            "last_started_at": None,
+            "last_finished_at": None,
+            "last_duration": None,
+            "last_result": None,
+            "last_error": None,
+        }
+
+    @property
+    def debounce(self):
+        return getattr(settings, "AUTH_SYNC_DEBOUNCE_SECONDS", 1.0)
+
+    @property
+    def status(self):
+        with self._lock:
+            status = dict(self._status)
+            status["pending"] = self._pending
+        return status
+
+    def schedule(self):
+        """
+        Queues a sync and returns immediately. Returns False if the signal was
+        coalesced into an already pending run.
+        """
+        with self._lock:
+            if self._pending:
+                self._status["coalesced"] += 1
+                return False
+
+            self._pending = True
+            if self._status["state"] == "idle":
+                self._status["state"] = "pending"
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._worker, name="auth-service-sync", daemon=True)
+                self._thread.start()
+        return True
+
+    def _worker(self):
+        while True:
+            time.sleep(self.debounce)
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    self._status["state"] = "idle"
+                    return
+                self._pending = False
+                self._status["state"] = "running"
+            try:
+                self.run()
+            finally:
+                connections.close_all()
+
+    def run(self):
+        started = time.monotonic()
+        with self._lock:
+            self._status["last_started_at"] = timezone.now().isoformat()
+
+        result, error = None, None
+        try:
+            if getattr(settings, "USER_DB_MODEL", False):
+                result = sync_users()
+        except Exception as err:
+            error = str(err)
+
+        with self._lock:
+            self._status.update({
+                "state": "pending" if self._pending else "idle",
+                "runs": self._status["runs"] + 1,
+                "last_finished_at": timezone.now().isoformat(),
+                "last_duration": round(time.monotonic() - started, 3),
+                "last_result": result,
+                "last_error": error,
+            })
+        return result
+
+
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,12 @@
+import django
+from django.conf import settings
+
+# lets the unit tests run without a host project; inside one, its settings are used
+if not settings.configured:
+    settings.configure(
+        INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"],
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        SERVICE_NAME="service",
+        SUB_SERVICE_NAME="sub_service",
+    )
+    django.setup()
@@ -0,0 +1,82 @@
+from unittest import TestCase, mock
+
+from auth_service.grpc_client.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class CircuitBreakerTests(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("auth_service.grpc_client.breaker.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success(0.01)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+    def test_single_probe_after_reset_timeout(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_success_closes(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success(0.01)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_failure_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_abandoned_probe_lets_next_call_probe(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_abandoned()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_lost_probe_is_replaced_after_reset_timeout(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+
+    def test_abandoned_call_does_not_touch_closed_breaker(self):
+        self.breaker.record_abandoned()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_latency_threshold_opens(self):
+        breaker = CircuitBreaker(latency_threshold=0.5, latency_percentile=0.5, window=4)
+        for latency in (0.1, 0.9, 0.9, 0.9):
+            breaker.record_success(latency)
+        self.assertEqual(breaker.state, OPEN)
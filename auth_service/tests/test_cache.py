@@ -0,0 +1,166 @@
+from unittest import TestCase, mock
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from auth_service.cache import CACHE_SCHEMA_VERSION, LRUCache, TieredCache, registry, token_cache
+
+
+class ClockTestCase(TestCase):
+    """
+    Freezes ``time.time`` and ``time.monotonic`` as seen by the cache module.
+    """
+
+    def setUp(self):
+        self.now = 1000000.0
+        clock = mock.Mock(time=lambda: self.now, monotonic=lambda: self.now)
+        patcher = mock.patch("auth_service.cache.time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        caches["default"].clear()
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class LRUCacheTests(ClockTestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1, 10)
+        cache.set("b", 2, 10)
+        cache.get("a")
+        cache.set("c", 3, 10)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_entries_expire(self):
+        cache = LRUCache()
+        cache.set("a", 1, 10)
+        self.advance(10)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.expirations, 1)
+
+    def test_non_positive_timeout_is_not_stored(self):
+        cache = LRUCache()
+        cache.set("a", 1, 0)
+        self.assertIsNone(cache.get("a"))
+
+
+class TieredCacheTests(ClockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = TieredCache("unit", ttl=60, local_ttl=5)
+        self.addCleanup(registry.pop, "unit", None)
+
+    def test_local_tier_then_shared_tier(self):
+        self.cache.set(1, "one")
+        self.assertEqual(self.cache.get(1), "one")
+        self.assertEqual(self.cache.hits, 1)
+        self.advance(5)
+        # the local copy expired, the shared one is still valid and is copied back locally
+        self.assertEqual(self.cache.get(1), "one")
+        self.assertEqual(self.cache.shared_hits, 1)
+        self.assertEqual(self.cache.get(1), "one")
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_get_many_mixes_tiers_and_counts_misses(self):
+        self.cache.set_many({1: "one", 2: "two"})
+        self.cache.local.delete(self.cache.make_key(2))
+        self.assertEqual(self.cache.get_many([1, 2, 3]), {1: "one", 2: "two"})
+        self.assertEqual(self.cache.stats()["local_hits"], 1)
+        self.assertEqual(self.cache.stats()["shared_hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_ttl_setting_disables_the_cache(self):
+        with override_settings(AUTH_UNIT_CACHE_TTL=0):
+            self.cache.set(1, "one")
+        self.assertIsNone(self.cache.get(1))
+
+    def test_keys_are_namespaced_by_service(self):
+        self.cache.set(1, "one")
+        key = self.cache.make_key(1)
+        self.assertEqual(key, f"auth:{CACHE_SCHEMA_VERSION}:service:sub_service:unit:1")
+        with override_settings(SERVICE_NAME="other"):
+            self.assertNotEqual(self.cache.make_key(1), key)
+            self.assertIsNone(self.cache.get(1))
+
+    def test_fresh_for_zero_is_a_miss(self):
+        cache = TieredCache("unit", ttl=60, local_ttl=5, fresh_for=lambda value: value["fresh"])
+        cache.set(1, {"fresh": 0})
+        cache.clear_local()
+        self.assertIsNone(cache.get(1))
+
+
+class TokenCacheTests(ClockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear_local()
+        self.addCleanup(token_cache.clear_local)
+
+    def test_verified_entry_expires_after_ttl(self):
+        token_cache.set_verified("token", 5)
+        self.assertEqual(token_cache.get("token")["user_id"], 5)
+        self.advance(token_cache.ttl)
+        self.assertIsNone(token_cache.get("token"))
+
+    def test_timeout_caps_the_ttl(self):
+        token_cache.set_verified("token", 5, timeout=2)
+        self.advance(2)
+        self.assertIsNone(token_cache.get("token"))
+
+    def test_rejected_entry_uses_negative_ttl(self):
+        with override_settings(AUTH_TOKEN_CACHE_NEGATIVE_TTL=3):
+            token_cache.set_rejected("bad", detail="Invalid token", status_detail="UNAUTHENTICATED")
+            self.assertFalse(token_cache.get("bad")["success"])
+            self.advance(3)
+            self.assertIsNone(token_cache.get("bad"))
+
+    def test_revoke_user_drops_tokens_verified_before(self):
+        token_cache.set_verified("token", 5)
+        token_cache.set_verified("other", 6)
+        self.advance(1)
+        token_cache.revoke_user(5)
+        self.assertIsNone(token_cache.get("token"))
+        self.assertEqual(token_cache.get("other")["user_id"], 6)
+
+        # the shared copy is refused too, e.g. in a process whose local tier still had it
+        token_cache.clear_local()
+        self.assertIsNone(token_cache.get("token"))
+
+        self.advance(1)
+        token_cache.set_verified("token", 5)
+        self.assertEqual(token_cache.get("token")["user_id"], 5)
+
+    def test_revoke_token(self):
+        token_cache.set_verified("token", 5)
+        token_cache.revoke_token("token", timeout=60)
+        self.assertIsNone(token_cache.get("token"))
+        self.assertTrue(token_cache.is_token_revoked("token"))
+        self.assertFalse(token_cache.is_token_revoked("other"))
+
+    def test_stale_entries_only_in_degraded_mode(self):
+        token_cache.set_verified("token", 5)
+        token_cache.set_rejected("bad")
+        self.advance(token_cache.ttl + 1)
+        self.assertIsNone(token_cache.get_stale("token"))
+
+    @override_settings(AUTH_DEGRADED_MODE=True, AUTH_DEGRADED_TOKEN_MAX_AGE=300)
+    def test_degraded_mode_serves_recent_verified_entries(self):
+        token_cache.set_verified("token", 5)
+        token_cache.set_rejected("bad")
+        self.advance(token_cache.ttl + 1)
+        self.assertIsNone(token_cache.get("token"))
+        self.assertEqual(token_cache.get_stale("token")["user_id"], 5)
+        self.assertIsNone(token_cache.get_stale("bad"))
+
+        token_cache.revoke_user(5)
+        self.assertIsNone(token_cache.get_stale("token"))
+
+    @override_settings(AUTH_DEGRADED_MODE=True, AUTH_DEGRADED_TOKEN_MAX_AGE=300)
+    def test_degraded_mode_has_a_max_age(self):
+        token_cache.set_verified("token", 5)
+        self.advance(301)
+        self.assertIsNone(token_cache.get_stale("token"))
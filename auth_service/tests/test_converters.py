@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+from google.protobuf.json_format import MessageToDict
+
+from auth_service.grpc_client import auth_pb2
+from auth_service.grpc_client.converters import message_to_dict
+
+
+def reference(message):
+    return MessageToDict(message, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
+
+
+def make_user(**fields):
+    defaults = dict(
+        id=7, national_id="1000000007", username="u7", first_name="F", last_name="L", phone="0912",
+        email="u7@x.io", image="", departments=["it", "hr"], roles=["staff"], is_active=True,
+        is_superuser=False, is_staff=True, access_level=3,
+        service=auth_pb2.ServiceInfo(name="svc", domain="svc.io"),
+        sub_services=[auth_pb2.SubServiceInfo(id=2, name="sub", pname="Sub", domain="sub.io",
+                                              description="desc", access_type="full", access_id=9),
+                      auth_pb2.SubServiceInfo(id=3, name="bare", domain="bare.io")],
+    )
+    defaults.update(fields)
+    return auth_pb2.UserData(**defaults)
+
+
+class ConverterTests(TestCase):
+
+    def assertSameAsMessageToDict(self, message):
+        self.assertEqual(message_to_dict(message), reference(message))
+
+    def test_user_data(self):
+        self.assertSameAsMessageToDict(make_user())
+
+    def test_user_data_without_service_and_defaults(self):
+        self.assertSameAsMessageToDict(auth_pb2.UserData(id=1))
+
+    def test_large_ids_are_strings(self):
+        user = make_user(id=2 ** 40, access_level=2 ** 33)
+        self.assertSameAsMessageToDict(user)
+        self.assertEqual(message_to_dict(user)["id"], str(2 ** 40))
+
+    def test_user_data_list(self):
+        self.assertSameAsMessageToDict(auth_pb2.UserDataList(users=[make_user(), make_user(id=8, roles=[])]))
+        self.assertSameAsMessageToDict(auth_pb2.UserDataList())
+
+    def test_user_ids(self):
+        self.assertSameAsMessageToDict(auth_pb2.UserIds(user_id=[1, 2, 2 ** 40]))
+
+    def test_verify_login_response(self):
+        self.assertSameAsMessageToDict(auth_pb2.VerifyLoginResponse(success=True, user_id=5))
+        self.assertSameAsMessageToDict(auth_pb2.VerifyLoginResponse())
+
+    def test_other_messages_fall_back_to_message_to_dict(self):
+        self.assertSameAsMessageToDict(auth_pb2.ServiceInfo(name="svc"))
@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+import grpc
+from django.test import override_settings
+
+from auth_service.grpc_client.retry import RetryBudget, RetryPolicy
+
+
+class FakeRpcError(grpc.RpcError):
+
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class RetryPolicyTests(TestCase):
+
+    def setUp(self):
+        with override_settings(AUTH_GRPC_MAX_RETRIES=2):
+            self.policy = RetryPolicy()
+
+    def test_connection_errors_reconnect_and_retry(self):
+        for code in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED):
+            err = FakeRpcError(code)
+            self.assertTrue(self.policy.should_reconnect(err))
+            self.assertTrue(self.policy.should_retry("GetUserData", err, 0))
+
+    def test_server_answers_are_not_retried(self):
+        for code in (grpc.StatusCode.UNKNOWN, grpc.StatusCode.INTERNAL, grpc.StatusCode.NOT_FOUND,
+                     grpc.StatusCode.UNAUTHENTICATED, grpc.StatusCode.INVALID_ARGUMENT):
+            err = FakeRpcError(code)
+            self.assertFalse(self.policy.should_reconnect(err))
+            self.assertFalse(self.policy.should_retry("VerifyLogin", err, 0))
+
+    def test_retries_are_bounded(self):
+        err = FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+        self.assertFalse(self.policy.should_retry("GetUserData", err, 2))
+        self.assertFalse(self.policy.should_retry("CreateUser", err, 0))
+
+    def test_budget_caps_retries(self):
+        budget = RetryBudget(ratio=0.5, max_tokens=2)
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
@@ -0,0 +1,80 @@
+import time
+from threading import Barrier, Event, Thread
+from unittest import TestCase
+
+from auth_service.grpc_client.singleflight import SingleFlight
+
+
+class SingleFlightTests(TestCase):
+
+    def run_concurrently(self, flight, key, func, callers=5):
+        results, errors = [], []
+        started = Barrier(callers)
+
+        def call():
+            started.wait()
+            try:
+                results.append(flight.do(key, func))
+            except Exception as err:
+                errors.append(err)
+
+        threads = [Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_callers_share_one_call(self):
+        flight, release, calls = SingleFlight(), Event(), []
+
+        def func():
+            calls.append(1)
+            release.wait(5)
+            return {"id": 1}
+
+        threads, results, errors = self.run_concurrently(flight, "key", func)
+        # the followers block on the leader's event; give them time to get there
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flight._calls, {})
+
+    def test_error_is_shared_and_key_released(self):
+        flight = SingleFlight()
+        error = ValueError("boom")
+
+        def fail():
+            raise error
+
+        with self.assertRaises(ValueError):
+            flight.do("key", fail)
+        self.assertEqual(flight._calls, {})
+        self.assertEqual(flight.do("key", lambda: 2), 2)
+
+    def test_waiter_gets_leader_error(self):
+        flight, release = SingleFlight(), Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("boom")
+
+        leader = Thread(target=lambda: self.assertRaises(ValueError, flight.do, "key", fail))
+        leader.start()
+        while not flight._calls:
+            pass
+        errors = []
+        waiter = Thread(target=lambda: errors.append(self.assertRaises(ValueError, flight.do, "key", lambda: 1)))
+        waiter.start()
+        release.set()
+        leader.join(5)
+        waiter.join(5)
+        self.assertEqual(len(errors), 1)
+
+    def test_different_keys_do_not_wait(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("a", lambda: 1), 1)
+        self.assertEqual(flight.do("b", lambda: 2), 2)
@@ -0,0 +1,61 @@
+from unittest import TestCase, mock
+
+from auth_service.sync import UserSync, diff_sorted_ids
+
+
+class DiffSortedIdsTests(TestCase):
+
+    def diff(self, remote_ids, local_ids):
+        return list(diff_sorted_ids(remote_ids, local_ids))
+
+    def test_yields_ids_present_on_one_side_only(self):
+        self.assertEqual(self.diff([1, 2, 4, 6], [2, 3, 4, 5]), [(1, True), (3, False), (5, False), (6, True)])
+
+    def test_empty_sides(self):
+        self.assertEqual(self.diff([], []), [])
+        self.assertEqual(self.diff([1, 2], []), [(1, True), (2, True)])
+        self.assertEqual(self.diff([], [1, 2]), [(1, False), (2, False)])
+
+    def test_identical_sides(self):
+        self.assertEqual(self.diff(range(100), range(100)), [])
+
+    def test_consumes_iterators_lazily(self):
+        remote_ids = iter([1, 3])
+        diff = diff_sorted_ids(remote_ids, iter([2]))
+        self.assertEqual(next(diff), (1, True))
+        self.assertEqual(list(remote_ids), [3])
+
+
+class UserSyncChunkTests(TestCase):
+
+    def run_sync(self, remote_ids, local_ids, batch_size):
+        chunks = []
+        sync = UserSync(batch_size=batch_size, dry_run=True,
+                        progress=lambda action, size, result: chunks.append((action, size)))
+        with mock.patch.object(UserSync, "fetch_remote_ids", return_value=remote_ids), \
+                mock.patch("auth_service.sync.iter_local_user_ids", return_value=iter(local_ids)):
+            return sync.run(), chunks
+
+    def test_creates_and_deletes_in_batches(self):
+        result, chunks = self.run_sync(list(range(1, 11)), [0, *range(5, 8), 20, 21, 22], batch_size=3)
+        self.assertEqual(result, {"remote": 10, "created": 7, "deleted": 4})
+        self.assertEqual([size for action, size in chunks if action == "created"], [3, 3, 1])
+        self.assertEqual([size for action, size in chunks if action == "deleted"], [3, 1])
+
+    def test_nothing_to_do(self):
+        result, chunks = self.run_sync([1, 2, 3], [1, 2, 3], batch_size=2)
+        self.assertEqual(result, {"remote": 3, "created": 0, "deleted": 0})
+        self.assertEqual(chunks, [])
+
+    def test_create_chunk_fetches_profiles_once_per_chunk(self):
+        sync = UserSync(batch_size=2)
+        sync.User = mock.Mock()
+        with mock.patch.object(UserSync, "fetch_users_data", return_value={1: {"national_id": "1"}}) as fetch, \
+                mock.patch("auth_service.sync.transaction.atomic"):
+            sync.create_chunk([1, 2])
+        fetch.assert_called_once_with([1, 2])
+        self.assertEqual(sync.User.call_args_list, [mock.call(id=1), mock.call(id=2)])
+        # only users present in the batch are filled; the others are not fetched one by one
+        sync.User.return_value.load_remote_fields.assert_called_once_with({"national_id": "1"})
+        self.assertEqual(len(sync.User.objects.bulk_create.call_args.args[0]), 2)
+        self.assertEqual(sync.result["created"], 2)
@@ -1,4 +1,3 @@
-from django.core.management import call_command
 from rest_framework import status
 from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
@@ -6,6 +5,11 @@ from rest_framework.views import APIView
 import json
 from django.conf import settings
 
+from .catalog import catalog
+from .serializers import UpdateSignalSerializer
+from .sync import apply_user_changes
+from .tasks import sync_scheduler
+
 
 class SystemPermission(BasePermission):
     """
@@ -51,5 +55,19 @@ class UpdateUserSignalApiView(APIView):
     permission_classes = [SystemPermission]
 
     def post(self, request):
-        call_command('sync_users_from_grpc')
-        return Response("DONE", status=status.HTTP_200_OK)
+        serializer = UpdateSignalSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        catalog.schedule_refresh()
+
+        # targeted signal: only the listed users are refreshed or evicted
+        if changes := serializer.validated_data.get('changes'):
+            result = apply_user_changes(changes)
+            return Response({"detail": "DONE", "result": result}, status=status.HTTP_200_OK)
+
+        if not getattr(settings, 'AUTH_SYNC_IN_BACKGROUND', True):
+            sync_scheduler.run()
+            return Response({"detail": "DONE", "status": sync_scheduler.status}, status=status.HTTP_200_OK)
+
+        queued = sync_scheduler.schedule()
+        return Response({"detail": "QUEUED" if queued else "COALESCED", "status": sync_scheduler.status},
+                        status=status.HTTP_202_ACCEPTED)